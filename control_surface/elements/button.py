@@ -9,4 +9,4 @@ class LightedButtonElement(LightedTransitionalProcessedValueElement):
         return True
 
     def is_pressed(self):
-        return True if any([value > 0 for value in self._owned_values()]) else False
+        return True if any(value > 0 for value in self._owned_values()) else False
@@ -29,13 +29,14 @@ def get_cc_for_key(row: int, col: int, direction: KeyDirection):
     return cc_base + direction.value
 
 
+# Offsets of each direction's CC from the navigation pedal's base CC.
+_NAV_CC_OFFSETS = {
+    KeyDirection.left: 0,
+    KeyDirection.right: 1,
+    KeyDirection.up: 2,
+    KeyDirection.down: 3,
+}
+
+
 def get_cc_for_nav(direction: KeyDirection):
-    return (
-        NAV_BASE_CC
-        + {
-            KeyDirection.left: 0,
-            KeyDirection.right: 1,
-            KeyDirection.up: 2,
-            KeyDirection.down: 3,
-        }[direction]
-    )
+    return NAV_BASE_CC + _NAV_CC_OFFSETS[direction]
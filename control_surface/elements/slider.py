@@ -383,7 +383,7 @@ class IncrementalSliderElement(ProcessedSliderElement):
             self._quantized_scroll_task.kill()
 
     def _on_value(self, value, control: InputControlElement):  # noqa: ARG002
-        if any([value > 0 for value in self._owned_values()]):
+        if any(value > 0 for value in self._owned_values()):
             parameter = self._connected_parameter
             if parameter is not None and parameter.is_enabled:
                 scroll_task = (
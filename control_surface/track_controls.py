@@ -5,7 +5,7 @@ from dataclasses import dataclass
 from enum import Enum
 from functools import partial
 from logging import getLogger
-from typing import Any, Callable, Dict, Optional, TypeVar
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
 
 from ableton.v2.control_surface.mode import SetAttributeMode, to_camel_case_name
 from ableton.v3.base import listenable_property, task
@@ -29,6 +29,14 @@ logger = getLogger(__name__)
 
 DELETE_DELAY = 1.0
 
+# Entrypoint modes added to each track controls component, as pairs of the mode name
+# template (formatted with the component's descriptor) and the name of the enter
+# handler.
+_ENTRY_MODES = (
+    ("edit_track_controls_{}", "_enter_edit_mode"),
+    ("track_controls_{}", "_enter_track_controls_mode"),
+)
+
 
 @dataclass
 class TrackControlsState:
@@ -134,13 +142,15 @@ class TrackControlsComponent(Component, Renderable):
 
         # Add entrypoint modes to perform setup before entering the edit or track
         # controls context.
-        self.__edit_mode_name = f"edit_track_controls_{descriptor}"
-        self.__track_controls_mode_name = f"track_controls_{descriptor}"
-        for mode_name, enter_fn in (
-            (self.__edit_mode_name, self._enter_edit_mode),
-            (self.__track_controls_mode_name, self._enter_track_controls_mode),
-        ):
-            self._modes.add_mode(mode_name, CallFunctionMode(on_enter_fn=enter_fn))
+        entry_mode_names = []
+        for mode_name_template, enter_fn_name in _ENTRY_MODES:
+            mode_name = mode_name_template.format(descriptor)
+            self._modes.add_mode(
+                mode_name,
+                CallFunctionMode(on_enter_fn=getattr(self, enter_fn_name)),
+            )
+            entry_mode_names.append(mode_name)
+        self.__edit_mode_name, self.__track_controls_mode_name = entry_mode_names
 
         # Dynamically create buttons to select each action and control type during
         # preset configuration.
@@ -211,7 +221,12 @@ class TrackControlsComponent(Component, Renderable):
 
         self._is_deleting: bool = False
         self._pending_state: PendingTrackControlsState = self._new_pending_state()
-        self.__track_controls_external_mode = None
+        # Names of the external modes created so far by the strategy, keyed by the
+        # state they were created for. Modes can't be removed from the modes component,
+        # so reuse them whenever the user returns to a previously-seen state.
+        self.__track_controls_external_mode_names: Dict[
+            Optional[Tuple[Action, TrackControl, TrackControl]], str
+        ] = {}
         self.__track_controls_external_mode_count = 0
 
     @property
@@ -221,7 +236,7 @@ class TrackControlsComponent(Component, Renderable):
     @strategy.setter
     def strategy(self, strategy: TrackControlsComponentStrategy):
         self._strategy = strategy
-        self.__track_controls_external_mode = None
+        self.__track_controls_external_mode_names.clear()
 
     @cancel_button.released_immediately
     def cancel_button(self, _):  # type: ignore
@@ -251,7 +266,6 @@ class TrackControlsComponent(Component, Renderable):
     def _delete(self):
         self.state = None
         self._is_deleting = False
-        self.__track_controls_external_mode = None
         self._update_cancel_button()
         self._cancel_edit()
         self.notify(self.notifications.TrackControls.delete, self.descriptor)
@@ -269,12 +283,12 @@ class TrackControlsComponent(Component, Renderable):
     @edit_action_button.released_immediately
     def edit_action_button(self, _):  # type: ignore
         self._set_edit_window(TrackControlsEditWindow.action)
-        self._modes.selected_mode = self.__edit_action_mode_name
+        self._set_mode_if_changed(self.__edit_action_mode_name)
 
     @edit_action_button.pressed_delayed
     def edit_action_button(self, _):
         self._set_edit_window(TrackControlsEditWindow.action_alt)
-        self._modes.selected_mode = self.__edit_action_alt_mode_name
+        self._set_mode_if_changed(self.__edit_action_alt_mode_name)
 
     # Modes to enter different UIs for the component.
     @lazy_attribute
@@ -300,9 +314,7 @@ class TrackControlsComponent(Component, Renderable):
                 action=state.action,
             )
             self._set_edit_window(None)
-            # Reset the external mode so it gets regenerated when needed.
-            self.__track_controls_external_mode = None
-            self._modes.selected_mode = None
+            self._set_mode_if_changed(None)
             self.strategy.finish_edit()
         else:
             self._set_edit_window(
@@ -310,8 +322,7 @@ class TrackControlsComponent(Component, Renderable):
                 if state.top_control is None
                 else TrackControlsEditWindow.bottom_control
             )
-            if self._modes.selected_mode != self.__edit_control_mode_name:
-                self._modes.selected_mode = self.__edit_control_mode_name
+            self._set_mode_if_changed(self.__edit_control_mode_name)
 
     def _pop_edit_step(self):
         selected_mode = self._modes.selected_mode
@@ -336,7 +347,7 @@ class TrackControlsComponent(Component, Renderable):
         self._next_edit_track_control_step()
 
     def _cancel_edit(self):
-        self._modes.selected_mode = None
+        self._set_mode_if_changed(None)
         self.strategy.cancel_edit()
 
     def _new_pending_state(self):
@@ -345,16 +356,28 @@ class TrackControlsComponent(Component, Renderable):
         )
 
     def _enter_track_controls_mode(self):
-        # Create the "real" mode if necessary.
-        if self.__track_controls_external_mode is None:
-            self.__track_controls_external_mode = self._strategy.create_mode(self.state)
+        state = self.state
+        key = (
+            None
+            if state is None
+            else (state.action, state.top_control, state.bottom_control)
+        )
+
+        # Create the "real" mode if we haven't seen this state yet.
+        mode_name = self.__track_controls_external_mode_names.get(key)
+        if mode_name is None:
             self.__track_controls_external_mode_count += 1
-            self._modes.add_mode(
-                self.__track_controls_external_mode_name(),
-                self.__track_controls_external_mode,
-            )
+            mode_name = self.__track_controls_external_mode_name()
+            self._modes.add_mode(mode_name, self._strategy.create_mode(state))
+            self.__track_controls_external_mode_names[key] = mode_name
+
+        self._set_mode_if_changed(mode_name)
 
-        self._modes.selected_mode = self.__track_controls_external_mode_name()
+    # Avoid triggering exit/enter work (and the associated listeners) when the target
+    # mode is already selected.
+    def _set_mode_if_changed(self, mode_name: Optional[str]):
+        if self._modes.selected_mode != mode_name:
+            self._modes.selected_mode = mode_name
 
     def set_enabled(self, enable):
         super().set_enabled(enable)
@@ -17,15 +17,19 @@ class UndoRedoComponent(UndoRedoComponentBase):
         super().__init__(*a, **k)
         self._original_undo_color = self.undo_button.color
         self._original_redo_color = self.redo_button.color
+        self._undo_redo_specs = (
+            (self.undo_button, self._original_undo_color),
+            (self.redo_button, self._original_redo_color),
+        )
 
-    def _can_undo(self):
-        return self.song and self.song.can_undo
-
-    def _can_redo(self):
-        return self.song and self.song.can_redo
+        # Last-seen (can_undo, can_redo) values, to avoid touching the buttons on
+        # ticks where nothing has changed.
+        self._last_can = (None, None)
 
     def update(self):
         super().update()
+        # Force the button colors to be re-applied, e.g. after a rebind.
+        self._last_can = (None, None)
         self._check_enabled_states()
         if self.is_enabled():
             if self._check_enabled_states_task.is_killed:
@@ -38,11 +42,16 @@ class UndoRedoComponent(UndoRedoComponentBase):
     # bound). Needed as a workaround for no undo/redo state
     # events.
     def _check_enabled_states(self):
-        for button, original_color, is_enabled in (
-            (self.undo_button, self._original_undo_color, self._can_undo),
-            (self.redo_button, self._original_redo_color, self._can_redo),
+        song = self.song
+        can = (song.can_undo, song.can_redo) if song else (False, False)
+        if can == self._last_can:
+            return
+        self._last_can = can
+
+        for (button, original_color), is_enabled in zip(
+            self._undo_redo_specs, can, strict=True
         ):
-            color = original_color if is_enabled() else "UndoRedo.Disabled"
+            color = original_color if is_enabled else "UndoRedo.Disabled"
             if button.color != color:
                 button.color = color
 
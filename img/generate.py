@@ -1,12 +1,14 @@
 # Generates diagrams for the README.
-import importlib.machinery
+import concurrent.futures
+import functools
+import hashlib
 import importlib.util
+import json
 import os
+import sys
 import typing
-from collections import namedtuple
-
-import svgwrite
-from typing_extensions import TypedDict
+from dataclasses import dataclass
+from types import MappingProxyType
 
 if typing.TYPE_CHECKING:
     # The type checker sees packages in the project root.
@@ -18,42 +20,138 @@ else:
     # surface, but the sysex constants would be too annoying to duplicate. Load it manually
     # from the path, see
     # https://csatlas.com/python-import-file-module/#import_a_file_in_a_different_directory.
+    #
+    # Loaded modules are registered in `sys.modules` under a private prefix, so repeated
+    # loads (e.g. in worker processes) reuse them without shadowing stdlib modules like
+    # `types`.
     def _load_module_from_path(name: str, path: str):
-        path = os.path.join(path, f"{name}.py")
-        loader = importlib.machinery.SourceFileLoader(name, path)
-        spec = importlib.util.spec_from_loader(name, loader)
+        module_name = f"_modestep_generate.{name}"
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        spec = importlib.util.spec_from_file_location(
+            module_name, os.path.join(path, f"{name}.py")
+        )
+        assert spec is not None and spec.loader is not None
         module = importlib.util.module_from_spec(spec)
-        loader.exec_module(module)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
         return module
 
+    _control_surface_dir = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), "..", "control_surface"
+    )
     hardware = _load_module_from_path(
-        "hardware",
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "..",
-            "control_surface",
-            "elements",
-        ),
+        "hardware", os.path.join(_control_surface_dir, "elements")
     )
-    types = _load_module_from_path(
-        "types",
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)), "..", "control_surface"
-        ),
+    types = _load_module_from_path("types", _control_surface_dir)
+    ui = _load_module_from_path("ui", _control_surface_dir)
+
+
+T = typing.TypeVar("T")
+
+
+# Minimal stand-in for the parts of `svgwrite.Drawing` used below. Elements are rendered
+# directly to strings, with attributes sorted by name to keep the output stable.
+def _escape(value: str) -> str:
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace('"', "&quot;")
+        .replace(">", "&gt;")
     )
-    ui = _load_module_from_path(
-        "ui",
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "..",
-            "control_surface",
-        ),
+
+
+def _element(tag: str, content: typing.Optional[str] = None, **attrs) -> str:
+    # Keyword arguments use underscores in place of dashes, as in svgwrite.
+    attrs_str = "".join(
+        f' {name}="{_escape(str(value))}"'
+        for name, value in sorted(
+            (name.replace("_", "-"), value) for name, value in attrs.items()
+        )
     )
+    if content is None:
+        return f"<{tag}{attrs_str}/>"
+    return f"<{tag}{attrs_str}>{_escape(content)}</{tag}>"
+
+
+class Drawing:
+    def __init__(self, filename: str, size: typing.Tuple[float, float]):
+        self.filename = filename
+        self._size = size
+        self._elements: typing.List[str] = []
+
+    def add(self, element: str) -> None:
+        self._elements.append(element)
+
+    @staticmethod
+    def rect(
+        insert: typing.Tuple[float, float] = (0, 0),
+        size: typing.Tuple[float, float] = (1, 1),
+        **attrs,
+    ) -> str:
+        x, y = insert
+        width, height = size
+        return _element("rect", x=x, y=y, width=width, height=height, **attrs)
+
+    @staticmethod
+    def line(
+        start: typing.Tuple[float, float],
+        end: typing.Tuple[float, float],
+        **attrs,
+    ) -> str:
+        x1, y1 = start
+        x2, y2 = end
+        return _element("line", x1=x1, y1=y1, x2=x2, y2=y2, **attrs)
+
+    @staticmethod
+    def text(text: str, **attrs) -> str:
+        return _element("text", text, **attrs)
+
+    def tostring(self, pretty: bool = False) -> str:
+        width, height = self._size
+        # Render the root as an empty element, then strip the trailing "/>" to get its
+        # opening tag.
+        svg_open = _element(
+            "svg",
+            baseProfile="full",
+            height=height,
+            version="1.1",
+            width=width,
+            xmlns="http://www.w3.org/2000/svg",
+            **{
+                "xmlns:ev": "http://www.w3.org/2001/xml-events",
+                "xmlns:xlink": "http://www.w3.org/1999/xlink",
+            },
+        )[:-2]
+        children = ["<defs/>", *self._elements]
+        if pretty:
+            # All elements are direct children of the root, so indenting them is all
+            # that's needed for readable output.
+            return "".join(
+                [f"{svg_open}>\n", *(f"  {child}\n" for child in children), "</svg>\n"]
+            )
+        return "".join([f"{svg_open}>", *children, "</svg>"])
 
+    def save(self, pretty: bool = False) -> None:
+        xml_string = self.tostring(pretty=pretty)
+
+        # Encode the full file up front and write it in one go.
+        data = f'<?xml version="1.0" encoding="utf-8" ?>\n{xml_string}'.encode()
+        with open(self.filename, "wb") as f:
+            f.write(data)
 
-T = typing.TypeVar("T")
 
-Pedal = namedtuple("Pedal", "desc long_press_desc color", defaults=(None, None, None))
+@dataclass(frozen=True, slots=True)
+class Pedal:
+    desc: str
+    long_press_desc: typing.Optional[str] = None
+    color: typing.Optional[str] = None
+
 
 PedalOpt = typing.Union[Pedal, None]
 
@@ -77,103 +175,191 @@ screen_width = height - screen_height - spacing * 3 / 2
 
 width = (spacing + pedal_size) * 5 + (screen_width + spacing)
 
+# Order in which pedals are drawn, i.e. key numbers 1-9, 0.
+_KEY_NUMBERS: typing.Tuple[int, ...] = tuple((idx + 1) % 10 for idx in range(10))
+
+# Key numbers for each position in a `ui.KeyMap`, i.e. the first row holds keys 6-9, 0.
+_KEY_NUMBER_GRID: typing.Tuple[typing.Tuple[int, ...], ...] = tuple(
+    tuple(
+        (((hardware.NUM_ROWS - 1 - row) * hardware.NUM_COLS) + col + 1)
+        % (hardware.NUM_ROWS * hardware.NUM_COLS)
+        for col in range(hardware.NUM_COLS)
+    )
+    for row in range(hardware.NUM_ROWS)
+)
+
+# Top-left corner of each pedal box, in drawing order.
+_PEDAL_XY: typing.Tuple[typing.Tuple[float, float], ...] = tuple(
+    (
+        spacing / 2 + (pedal_size + spacing) * (idx % 5),
+        spacing / 2 + (pedal_size + spacing) * (1 - idx // 5),
+    )
+    for idx in range(10)
+)
+
+# Number labels for each pedal, in drawing order.
+_NUM_LABELS: typing.Tuple[str, ...] = tuple(
+    str(key_number) for key_number in _KEY_NUMBERS
+)
+
+# Pedal definitions for a diagram, indexed by key number.
+Pedals = typing.Sequence[PedalOpt]
+
+NO_PEDALS: Pedals = (None,) * 10
+
+
+# Build a diagram's pedal definitions from a map of key numbers to pedals.
+def pedals_for_keys(pedals: typing.Mapping[int, Pedal]) -> typing.List[PedalOpt]:
+    result: typing.List[PedalOpt] = [None] * 10
+    for key_number, pedal in pedals.items():
+        result[key_number] = pedal
+    return result
+
+
+# Merge pedal definitions, with pedals from later arguments taking precedence.
+def merge_pedals(*all_pedals: Pedals) -> typing.List[PedalOpt]:
+    result: typing.List[PedalOpt] = [None] * 10
+    for pedals in all_pedals:
+        for key_number, pedal in enumerate(pedals):
+            if pedal is not None:
+                result[key_number] = pedal
+    return result
+
+
+# Label size classes, and the font multiplier for each.
+_SIZE_CLASS_LARGE = 0
+_SIZE_CLASS_MIDDLE = 1
+_SIZE_CLASS_SMALL = 2
+_FONT_MULTIPLIERS: typing.Tuple[float, ...] = (1.8, 1.15, 1)
+
+# Line offsets from the label center as multiples of the max height, keyed by (number
+# of lines, whether the label is middle-sized).
+_SEGMENT_FACTORS: typing.Dict[typing.Tuple[int, bool], typing.Tuple[float, ...]] = {
+    (1, False): (0.0,),
+    (1, True): (0.0,),
+    (2, False): (-0.25, 0.25),
+    (2, True): (-0.28, 0.28),
+    (3, False): (-0.5, 0.0, 0.5),
+    (3, True): (-0.5, 0.0, 0.5),
+}
+
+
+# Hacky helper to lay out potentially multi-line text. Lots of one-off logic and
+# adjustments. Returns the CSS font size, and each line's text with its y offset from the
+# center as a multiple of the max height. Cached since the same labels appear repeatedly
+# across diagrams.
+@functools.lru_cache(maxsize=512)
+def _layout_desc(
+    desc: str, base_font_size: float
+) -> typing.Tuple[str, typing.Tuple[typing.Tuple[str, float], ...]]:
+    lines = desc.split("\n")
+    assert len(lines) <= 3
+
+    max_line_length = max(map(len, lines))
+
+    if max_line_length <= 5 and len(lines) == 1:
+        size_class = _SIZE_CLASS_LARGE
+    elif max_line_length <= 8:
+        size_class = _SIZE_CLASS_MIDDLE
+    else:
+        size_class = _SIZE_CLASS_SMALL
+
+    font_size = f"{_FONT_MULTIPLIERS[size_class] * base_font_size}em"
+    segments = tuple(
+        zip(
+            lines,
+            _SEGMENT_FACTORS[(len(lines), size_class == _SIZE_CLASS_MIDDLE)],
+            strict=True,
+        )
+    )
+
+    return font_size, segments
+
+
+# Render potentially multi-line text centered at the given position.
+def _add_desc(
+    dwg: Drawing,
+    desc: str,
+    x_center: float,
+    y_center: float,
+    max_height: float,
+    base_font_size: float,
+):
+    font_size, segments = _layout_desc(desc, base_font_size)
+    for text, y_factor in segments:
+        dwg.add(
+            dwg.text(
+                text,
+                fill="black",
+                style=f"font-family: monospace; font-size: {font_size};",
+                text_anchor="middle",
+                dominant_baseline="middle",
+                x=x_center,
+                y=y_center + y_factor * max_height,
+            )
+        )
+
 
-class DiagramNavArgs(TypedDict):
-    vertical_nav: str
-    horizontal_nav: str
+# Elements that are the same in every diagram, rendered once.
+screen_x_offset = ((spacing + pedal_size) * 5) + spacing / 2
+nav_y_offset = screen_height + spacing
+
+# Background box.
+_BACKGROUND = Drawing.rect(size=(width, height), fill="#414243", rx=10, ry=10)
+
+# Screen.
+_SCREEN = Drawing.rect(
+    insert=((spacing + pedal_size) * 5 + spacing / 2, spacing / 2),
+    size=(screen_width, screen_height),
+    fill="black",
+    rx=3,
+    ry=3,
+)
+
+# Nav pad and label.
+_NAV_PAD = Drawing.rect(
+    insert=(screen_x_offset, nav_y_offset),
+    size=(screen_width, screen_width),
+    fill="white",
+    rx=8,
+    ry=8,
+)
+_NAV_LABEL = Drawing.text(
+    "Nav",
+    text_anchor="middle",
+    dominant_baseline="middle",
+    fill=bg_text_color,
+    style="font-size: 0.8em; font-family: monospace;",
+    x=screen_x_offset + screen_width / 2,
+    y=nav_y_offset + screen_width + spacing / 4,
+)
+
+# Line in nav pad.
+_NAV_LINE = Drawing.line(
+    start=(screen_x_offset, nav_y_offset + screen_width / 2),
+    end=(screen_x_offset + screen_width, nav_y_offset + screen_width / 2),
+    stroke="black",
+    stroke_width=1,
+    fill="black",
+)
 
 
 def diagram(
     filename: str,
-    pedal1: PedalOpt = None,
-    pedal2: PedalOpt = None,
-    pedal3: PedalOpt = None,
-    pedal4: PedalOpt = None,
-    pedal5: PedalOpt = None,
-    pedal6: PedalOpt = None,
-    pedal7: PedalOpt = None,
-    pedal8: PedalOpt = None,
-    pedal9: PedalOpt = None,
-    pedal0: PedalOpt = None,
+    pedals: Pedals = NO_PEDALS,
+    *,
     display: str = "",
     vertical_nav: str = "",
     horizontal_nav: str = "",
-) -> svgwrite.Drawing:
-    dwg = svgwrite.Drawing(filename, size=(width, height))
-
-    # Background box.
-    dwg.add(dwg.rect(size=(width, height), fill="#414243", rx=10, ry=10))
-
-    # Hacky helper to render potentially multi-line text. Lots of
-    # one-off logic and adjustments.
-    def add_desc(
-        desc: str,
-        x_center: float,
-        y_center: float,
-        max_height: float,
-        base_font_size: float,
-    ):
-        lines = desc.split("\n")
-        assert len(lines) <= 3
-
-        max_line_length = max([len(line) for line in lines])
-
-        is_middle_size = False
-        if max_line_length <= 5 and len(lines) == 1:
-            font_multiplier = 1.8
-        elif max_line_length <= 8:
-            font_multiplier = 1.15
-            is_middle_size = True
-        else:
-            font_multiplier = 1
-
-        font_size = f"{font_multiplier * base_font_size}em"
-
-        if len(lines) == 3:
-            segments = [
-                (lines[0], y_center - max_height / 2),
-                (lines[1], y_center),
-                (lines[2], y_center + max_height / 2),
-            ]
-        elif len(lines) == 2:
-            if is_middle_size:
-                offset = max_height * 0.28
-            else:
-                offset = max_height / 4
-
-            segments = [(lines[0], y_center - offset), (lines[1], y_center + offset)]
-        else:
-            segments = [(desc, y_center)]
-
-        for text, y in segments:
-            dwg.add(
-                dwg.text(
-                    text,
-                    fill="black",
-                    style=f"font-family: monospace; font-size: {font_size};",
-                    text_anchor="middle",
-                    dominant_baseline="middle",
-                    x=[x_center],
-                    y=[y],
-                )
-            )
+) -> Drawing:
+    dwg = Drawing(filename, size=(width, height))
 
-    for idx, pedal in enumerate(
-        [
-            pedal1,
-            pedal2,
-            pedal3,
-            pedal4,
-            pedal5,
-            pedal6,
-            pedal7,
-            pedal8,
-            pedal9,
-            pedal0,
-        ]
+    dwg.add(_BACKGROUND)
+
+    for key_number, (x_offset, y_offset), num_label in zip(
+        _KEY_NUMBERS, _PEDAL_XY, _NUM_LABELS, strict=True
     ):
-        x_offset = spacing / 2 + (pedal_size + spacing) * (idx % 5)
-        y_offset = spacing / 2 + (pedal_size + spacing) * (1 - int(idx / 5.0))
+        pedal = pedals[key_number]
         pedal_stroke_width = 4
 
         # Boxes for individual pedals.
@@ -197,13 +383,13 @@ def diagram(
         # Number labels.
         dwg.add(
             dwg.text(
-                str((idx + 1) % 10),
+                num_label,
                 fill=bg_text_color,
                 text_anchor="middle",
                 dominant_baseline="middle",
                 style="font-family: monospace;",
-                x=[x_offset + pedal_size / 2],
-                y=[y_offset + pedal_size + spacing / 4],
+                x=x_offset + pedal_size / 2,
+                y=y_offset + pedal_size + spacing / 4,
             )
         )
 
@@ -212,7 +398,8 @@ def diagram(
             padding_pct = 0.4
             # Function description at the top (if there's a long-press
             # action) or middle of the pedal box.
-            add_desc(
+            _add_desc(
+                dwg,
                 desc=pedal.desc,
                 x_center=x_offset + pedal_size / 2,
                 y_center=y_offset
@@ -236,7 +423,8 @@ def diagram(
 
                 # Long press function description at the bottom of the
                 # pedal box.
-                add_desc(
+                _add_desc(
+                    dwg,
                     desc=pedal.long_press_desc,
                     x_center=(x_offset + pedal_size / 2),
                     y_center=(y_offset + pedal_size * 3 / 4 + 3),
@@ -249,23 +437,12 @@ def diagram(
                         fill=alt_pedal_text_color,
                         style="font-family: monospace; font-size: 0.8em;",
                         dominant_baseline="hanging",
-                        x=[x_offset + pedal_stroke_width],
-                        y=[y_offset + pedal_size / 2 + 1],
+                        x=x_offset + pedal_stroke_width,
+                        y=y_offset + pedal_size / 2 + 1,
                     )
                 )
 
-    # Screen.
-    dwg.add(
-        dwg.rect(
-            insert=((spacing + pedal_size) * 5 + spacing / 2, spacing / 2),
-            size=(screen_width, screen_height),
-            fill="black",
-            rx=3,
-            ry=3,
-        )
-    )
-
-    screen_x_offset = ((spacing + pedal_size) * 5) + spacing / 2
+    dwg.add(_SCREEN)
     dwg.add(
         dwg.text(
             display,
@@ -274,35 +451,14 @@ def diagram(
             dominant_baseline="middle",
             fill="red",
             style="font-size: 2em; font-family: monospace;",
-            y=[spacing / 2 + screen_height / 2],
-            x=[screen_x_offset + screen_width / 2],
+            y=spacing / 2 + screen_height / 2,
+            x=screen_x_offset + screen_width / 2,
             **{"xml:space": "preserve"},
         )
     )
 
-    # Nav pad and label.
-    nav_y_offset = screen_height + spacing
-    dwg.add(
-        dwg.rect(
-            insert=(screen_x_offset, nav_y_offset),
-            size=(screen_width, screen_width),
-            fill="white",
-            rx=8,
-            ry=8,
-        )
-    )
-
-    dwg.add(
-        dwg.text(
-            "Nav",
-            text_anchor="middle",
-            dominant_baseline="middle",
-            fill=bg_text_color,
-            style="font-size: 0.8em; font-family: monospace;",
-            x=[screen_x_offset + screen_width / 2],
-            y=[nav_y_offset + screen_width + spacing / 4],
-        )
-    )
+    dwg.add(_NAV_PAD)
+    dwg.add(_NAV_LABEL)
 
     # Up/down nav text.
     if vertical_nav:
@@ -313,11 +469,12 @@ def diagram(
                 dominant_baseline="middle",
                 fill=alt_pedal_text_color,
                 style="font-size: 4em; font-family: monospace;",
-                y=[nav_y_offset + screen_width / 4],
-                x=[screen_x_offset + screen_width / 8],
+                y=nav_y_offset + screen_width / 4,
+                x=screen_x_offset + screen_width / 8,
             )
         )
-        add_desc(
+        _add_desc(
+            dwg,
             desc=vertical_nav,
             x_center=screen_x_offset + screen_width / 2,
             y_center=nav_y_offset + screen_width / 4,
@@ -331,21 +488,12 @@ def diagram(
                 dominant_baseline="middle",
                 fill=alt_pedal_text_color,
                 style="font-size: 4em; font-family: monospace;",
-                y=[nav_y_offset + screen_width / 4],
-                x=[screen_x_offset + screen_width * 7 / 8],
+                y=nav_y_offset + screen_width / 4,
+                x=screen_x_offset + screen_width * 7 / 8,
             )
         )
 
-    # Line in nav pad.
-    dwg.add(
-        dwg.line(
-            start=(screen_x_offset, nav_y_offset + screen_width / 2),
-            end=(screen_x_offset + screen_width, nav_y_offset + screen_width / 2),
-            stroke="black",
-            stroke_width=1,
-            fill="black",
-        )
-    )
+    dwg.add(_NAV_LINE)
 
     # Left/right nav text.
     if horizontal_nav:
@@ -356,11 +504,12 @@ def diagram(
                 dominant_baseline="middle",
                 fill=alt_pedal_text_color,
                 style="font-size: 4em; font-family: monospace;",
-                y=[nav_y_offset + screen_width * 3 / 4],
-                x=[screen_x_offset + screen_width / 8],
+                y=nav_y_offset + screen_width * 3 / 4,
+                x=screen_x_offset + screen_width / 8,
             )
         )
-        add_desc(
+        _add_desc(
+            dwg,
             desc=horizontal_nav,
             x_center=screen_x_offset + screen_width / 2,
             y_center=nav_y_offset + screen_width * 3 / 4,
@@ -374,13 +523,114 @@ def diagram(
                 dominant_baseline="middle",
                 fill=alt_pedal_text_color,
                 style="font-size: 4em; font-family: monospace;",
-                y=[nav_y_offset + screen_width * 3 / 4],
-                x=[screen_x_offset + screen_width * 7 / 8],
+                y=nav_y_offset + screen_width * 3 / 4,
+                x=screen_x_offset + screen_width * 7 / 8,
             )
         )
     return dwg
 
 
+# Output filename and `diagram` keyword arguments.
+DiagramJob = typing.Tuple[str, typing.Dict[str, typing.Any]]
+
+
+# Render and save a single diagram. Defined at the top level so it can be dispatched to
+# worker processes.
+def _render(job: DiagramJob) -> None:
+    filename, kwargs = job
+    diagram(filename, **kwargs).save(pretty=True)
+
+
+# Hashes of the inputs used to generate each diagram on the previous run, so unchanged
+# diagrams can be skipped. Stored relative to the output directory.
+_CACHE_FILENAME = ".generate-cache.json"
+
+
+def _load_cache() -> typing.Dict[str, str]:
+    try:
+        with open(_CACHE_FILENAME) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_cache(cache: typing.Dict[str, str]) -> None:
+    with open(_CACHE_FILENAME, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+# Hash of everything that determines a diagram's output: the generator itself (which
+# includes all layout logic), and the diagram's arguments.
+def _job_hash(generator_hash: str, job: DiagramJob) -> str:
+    filename, kwargs = job
+    return hashlib.blake2b(
+        repr((generator_hash, filename, sorted(kwargs.items()))).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+# Display labels for navigation targets.
+_NAV_LABELS: typing.Dict[types.NavigationTarget, str] = {
+    "selected_scene": "Selected\nScene",
+    "selected_track": "Selected\nTrack",
+    "device_bank": "Device\nBank",
+    "selected_device": "Selected\nDevice",
+    "session_ring_scenes": "Session\nRing\nScenes",
+    "session_ring_tracks": "Session\nRing\nTracks",
+}
+
+
+# Navigation targets for a main mode. Just hard-code the categorization logic, will need
+# to be updated if it changes on the application side.
+def _navigation_targets(mode: types.MainMode) -> ui.NavigationTargets:
+    if mode.startswith("device_"):
+        return ui.DEVICE_NAVIGATION_TARGETS
+    elif mode.startswith("track_controls_") or mode.startswith("edit_track_controls_"):
+        return ui.SESSION_RING_NAVIGATION_TARGETS
+    elif mode in ("mode_select", "transport", "utility"):
+        return ui.SELECTION_NAVIGATION_TARGETS
+    else:
+        raise RuntimeError(f"unexpected nav mode: {mode}")
+
+
+# Navigation targets for every main mode, i.e. everything reachable from the mode select
+# screen plus the mode select screen itself.
+_NAV_FOR_MODE: typing.Dict[types.MainMode, ui.NavigationTargets] = {
+    mode: _navigation_targets(mode)
+    for mode in (
+        "mode_select",
+        *(
+            mode
+            for row in ui.MODE_SELECT_KEY_MAP
+            for spec in row
+            if spec is not None
+            for mode in spec
+            if mode is not None
+        ),
+    )
+}
+
+
+# Nav pad arguments for a main mode. Cached since it's requested repeatedly for the same
+# handful of modes; the result is read-only so the cached value can't be mutated by
+# callers.
+@functools.lru_cache(maxsize=None)
+def navigation(mode: types.MainMode) -> typing.Mapping[str, str]:
+    try:
+        horizontal_nav, vertical_nav = _NAV_FOR_MODE[mode]
+    except KeyError:
+        raise RuntimeError(f"unexpected nav mode: {mode}") from None
+
+    return MappingProxyType(
+        {
+            "horizontal_nav": _NAV_LABELS[horizontal_nav],
+            "vertical_nav": _NAV_LABELS[vertical_nav],
+        }
+    )
+
+
 # Shorthand method for pedal definitions.
 def pedal(
     desc: str,
@@ -395,8 +645,6 @@ if __name__ == "__main__":
     # outside of a python module context. See
     # https://stackoverflow.com/a/11158224.
     import inspect
-    import os
-    import sys
 
     current_frame = inspect.currentframe()
     assert current_frame
@@ -405,67 +653,37 @@ if __name__ == "__main__":
     parentdir = os.path.dirname(currentdir)
     sys.path.insert(0, parentdir)
 
+    # Diagrams are independent of each other. Collect them here and render them in
+    # parallel at the end.
+    jobs: typing.List[DiagramJob] = []
+
+    def add_diagram(filename: str, **kwargs):
+        jobs.append((filename, kwargs))
+
     def display_name(mode: types.MainMode):
         # Replace uppercase characters that are just there because
         # they look better in the SoftStep's rendering.
         return ui.MAIN_MODE_DISPLAY_NAMES[mode].replace("K", "k")
 
     session_record_pedal = pedal("Session\nRecord")
-    session_record = {"pedal5": session_record_pedal}
-    mode_select: typing.Dict[str, PedalOpt] = {
-        "pedal0": pedal("Mode\nSelect", "Jump to\nRecent Mode")
-    }
-
-    def navigation(mode: types.MainMode) -> DiagramNavArgs:
-        navigation_mode_labels: typing.Dict[types.NavigationTarget, str] = {
-            "selected_scene": "Selected\nScene",
-            "selected_track": "Selected\nTrack",
-            "device_bank": "Device\nBank",
-            "selected_device": "Selected\nDevice",
-            "session_ring_scenes": "Session\nRing\nScenes",
-            "session_ring_tracks": "Session\nRing\nTracks",
-        }
-
-        # Just hard-code the categorization logic, will need to be updated if it changes
-        # on the application side.
-        horizontal_nav: types.NavigationTarget
-        vertical_nav: types.NavigationTarget
-        if mode.startswith("device_"):
-            horizontal_nav, vertical_nav = ui.DEVICE_NAVIGATION_TARGETS
-        elif mode.startswith("track_controls_") or mode.startswith(
-            "edit_track_controls_"
-        ):
-            horizontal_nav, vertical_nav = ui.SESSION_RING_NAVIGATION_TARGETS
-        elif mode in ("mode_select", "transport", "utility"):
-            horizontal_nav, vertical_nav = ui.SELECTION_NAVIGATION_TARGETS
-        else:
-            raise RuntimeError(f"unexpected nav mode: {mode}")
-
-        return {
-            "horizontal_nav": navigation_mode_labels[horizontal_nav],
-            "vertical_nav": navigation_mode_labels[vertical_nav],
-        }
+    session_record = pedals_for_keys({5: session_record_pedal})
+    mode_select = pedals_for_keys({0: pedal("Mode\nSelect", "Jump to\nRecent Mode")})
 
-    device_lock = {
-        "pedal5": pedal("Device\nLock"),
-    }
-    interstitial_mode = {"pedal0": pedal("Cancel", "Jump to\nRecent Mode")}
+    device_lock = pedals_for_keys({5: pedal("Device\nLock")})
+    interstitial_mode = pedals_for_keys({0: pedal("Cancel", "Jump to\nRecent Mode")})
 
     def params_from_key_map(
         key_map: ui.KeyMap[T], to_pedal: typing.Callable[[T], Pedal]
-    ):
-        args = {}
+    ) -> typing.List[PedalOpt]:
+        pedals: typing.List[PedalOpt] = [None] * 10
         for row, specs in enumerate(key_map):
             for col, spec in enumerate(specs):
                 if spec is not None:
-                    key_number = (
-                        ((hardware.NUM_ROWS - 1 - row) * hardware.NUM_COLS) + col + 1
-                    ) % (hardware.NUM_ROWS * hardware.NUM_COLS)
                     pedal = to_pedal(spec)
                     if pedal is not None:
-                        args[f"pedal{key_number}"] = pedal
+                        pedals[_KEY_NUMBER_GRID[row][col]] = pedal
 
-        return args
+        return pedals
 
     track_control_descriptions: typing.Dict[types.TrackControl, str] = {
         "volume": "Volume\nControls",
@@ -494,8 +712,8 @@ if __name__ == "__main__":
         ]
         mode_descriptions[edit_track_controls_mode] = "Edit"
 
-    mode_select_params = {
-        **params_from_key_map(
+    mode_select_pedals = merge_pedals(
+        params_from_key_map(
             ui.MODE_SELECT_KEY_MAP,
             lambda m: pedal(
                 mode_descriptions[m[0]],
@@ -507,14 +725,14 @@ if __name__ == "__main__":
                 ),
             ),
         ),
-        **interstitial_mode,
-        **navigation("mode_select"),
-    }
-    diagram(
+        interstitial_mode,
+    )
+    add_diagram(
         "mode-select.svg",
+        pedals=mode_select_pedals,
         display=ui.MAIN_MODE_DISPLAY_NAMES["mode_select"][0:4],
-        **mode_select_params,
-    ).save(pretty=True)
+        **navigation("mode_select"),
+    )
 
     # Define pedals for actions here; their positions will be computed
     # dynamically for the transport/utility modes.
@@ -541,153 +759,205 @@ if __name__ == "__main__":
     transport_mode_pedal_params = params_from_key_map(
         ui.TRANSPORT_KEY_MAP, lambda action: action_pedals[action]
     )
-    diagram(
+    add_diagram(
         "transport-mode.svg",
+        pedals=merge_pedals(
+            transport_mode_pedal_params,
+            mode_select,
+        ),
         display=display_name("transport"),
-        **transport_mode_pedal_params,
-        **mode_select,
         **navigation("transport"),
-    ).save(pretty=True)
+    )
 
     utility_mode_pedal_params = params_from_key_map(
         ui.UTILITY_KEY_MAP, lambda action: action_pedals[action]
     )
-    diagram(
+    add_diagram(
         "utility-mode.svg",
+        pedals=merge_pedals(
+            utility_mode_pedal_params,
+            mode_select,
+        ),
         display=display_name("utility"),
-        **utility_mode_pedal_params,
-        **mode_select,
         **navigation("utility"),
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "device-parameters-pressure-mode.svg",
-        pedal1=pedal("Pressure\nParam 5"),
-        pedal2=pedal("Pressure\nParam 6"),
-        pedal3=pedal("Pressure\nParam 7"),
-        pedal4=pedal("Pressure\nParam 8"),
-        pedal6=pedal("Pressure\nParam 1"),
-        pedal7=pedal("Pressure\nParam 2"),
-        pedal8=pedal("Pressure\nParam 3"),
-        pedal9=pedal("Pressure\nParam 4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Pressure\nParam 5"),
+                    2: pedal("Pressure\nParam 6"),
+                    3: pedal("Pressure\nParam 7"),
+                    4: pedal("Pressure\nParam 8"),
+                    6: pedal("Pressure\nParam 1"),
+                    7: pedal("Pressure\nParam 2"),
+                    8: pedal("Pressure\nParam 3"),
+                    9: pedal("Pressure\nParam 4"),
+                }
+            ),
+            device_lock,
+            mode_select,
+        ),
         display=display_name("device_parameters_pressure"),
         **navigation("device_parameters_pressure"),
-        **device_lock,
-        **mode_select,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "device-parameters-increment-mode.svg",
-        pedal1=pedal("Y Incr.\nParam 5"),
-        pedal2=pedal("Y Incr.\nParam 6"),
-        pedal3=pedal("Y Incr.\nParam 7"),
-        pedal4=pedal("Y Incr.\nParam 8"),
-        pedal6=pedal("Y Incr.\nParam 1"),
-        pedal7=pedal("Y Incr.\nParam 2"),
-        pedal8=pedal("Y Incr.\nParam 3"),
-        pedal9=pedal("Y Incr.\nParam 4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Y Incr.\nParam 5"),
+                    2: pedal("Y Incr.\nParam 6"),
+                    3: pedal("Y Incr.\nParam 7"),
+                    4: pedal("Y Incr.\nParam 8"),
+                    6: pedal("Y Incr.\nParam 1"),
+                    7: pedal("Y Incr.\nParam 2"),
+                    8: pedal("Y Incr.\nParam 3"),
+                    9: pedal("Y Incr.\nParam 4"),
+                }
+            ),
+            device_lock,
+            mode_select,
+        ),
         display=display_name("device_parameters_increment"),
         **navigation("device_parameters_increment"),
-        **device_lock,
-        **mode_select,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "device-parameters-xy-mode.svg",
-        pedal1=pedal("XY Latch\nParams\n5/6"),
-        pedal2=pedal("XY Latch\nParams\n7/8"),
-        pedal3=pedal("XY\nParams\n5/6"),
-        pedal4=pedal("XY\nParams\n7/8"),
-        pedal6=pedal("XY Latch\nParams\n1/2"),
-        pedal7=pedal("XY Latch\nParams\n3/4"),
-        pedal8=pedal("XY\nParams\n1/2"),
-        pedal9=pedal("XY\nParams\n3/4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("XY Latch\nParams\n5/6"),
+                    2: pedal("XY Latch\nParams\n7/8"),
+                    3: pedal("XY\nParams\n5/6"),
+                    4: pedal("XY\nParams\n7/8"),
+                    6: pedal("XY Latch\nParams\n1/2"),
+                    7: pedal("XY Latch\nParams\n3/4"),
+                    8: pedal("XY\nParams\n1/2"),
+                    9: pedal("XY\nParams\n3/4"),
+                }
+            ),
+            device_lock,
+            mode_select,
+        ),
         display=display_name("device_parameters_xy"),
         **navigation("device_parameters_xy"),
-        **device_lock,
-        **mode_select,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "expression-pedal-map-mode.svg",
-        pedal1=pedal("Map to\nParam\n5"),
-        pedal2=pedal("Map to\nParam\n6"),
-        pedal3=pedal("Map to\nParam\n7"),
-        pedal4=pedal("Map to\nParam\n8"),
-        pedal6=pedal("Map to\nParam\n1"),
-        pedal7=pedal("Map to\nParam\n2"),
-        pedal8=pedal("Map to\nParam\n3"),
-        pedal9=pedal("Map to\nParam\n4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Map to\nParam\n5"),
+                    2: pedal("Map to\nParam\n6"),
+                    3: pedal("Map to\nParam\n7"),
+                    4: pedal("Map to\nParam\n8"),
+                    6: pedal("Map to\nParam\n1"),
+                    7: pedal("Map to\nParam\n2"),
+                    8: pedal("Map to\nParam\n3"),
+                    9: pedal("Map to\nParam\n4"),
+                }
+            ),
+            device_lock,
+            mode_select,
+        ),
         display=display_name("device_expression_map"),
         **navigation("device_expression_map"),
-        **device_lock,
-        **mode_select,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "device-bank-mode.svg",
-        pedal1=pedal("Select\nBank 5"),
-        pedal2=pedal("Select\nBank 6"),
-        pedal3=pedal("Select\nBank 7"),
-        pedal4=pedal("Select\nBank 8"),
-        pedal6=pedal("Select\nBank 1"),
-        pedal7=pedal("Select\nBank 2"),
-        pedal8=pedal("Select\nBank 3"),
-        pedal9=pedal("Select\nBank 4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Select\nBank 5"),
+                    2: pedal("Select\nBank 6"),
+                    3: pedal("Select\nBank 7"),
+                    4: pedal("Select\nBank 8"),
+                    6: pedal("Select\nBank 1"),
+                    7: pedal("Select\nBank 2"),
+                    8: pedal("Select\nBank 3"),
+                    9: pedal("Select\nBank 4"),
+                }
+            ),
+            device_lock,
+            mode_select,
+        ),
         display=display_name("device_bank_select"),
         **navigation("device_bank_select"),
-        **device_lock,
-        **mode_select,
-    ).save(pretty=True)
+    )
 
     track_controls_nav = navigation("track_controls_1")
-    diagram(
+    add_diagram(
         "solo-arm-mode.svg",
-        pedal1=pedal("Arm\nTrack 1"),
-        pedal2=pedal("Arm\nTrack 2"),
-        pedal3=pedal("Arm\nTrack 3"),
-        pedal4=pedal("Arm\nTrack 4"),
-        pedal5=pedal("Session\nRecord"),
-        pedal6=pedal("Solo\nTrack 1"),
-        pedal7=pedal("Solo\nTrack 2"),
-        pedal8=pedal("Solo\nTrack 3"),
-        pedal9=pedal("Solo\nTrack 4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Arm\nTrack 1"),
+                    2: pedal("Arm\nTrack 2"),
+                    3: pedal("Arm\nTrack 3"),
+                    4: pedal("Arm\nTrack 4"),
+                    5: pedal("Session\nRecord"),
+                    6: pedal("Solo\nTrack 1"),
+                    7: pedal("Solo\nTrack 2"),
+                    8: pedal("Solo\nTrack 3"),
+                    9: pedal("Solo\nTrack 4"),
+                }
+            ),
+            mode_select,
+        ),
         display=f"{ui.TRACK_CONTROL_DISPLAY_NAMES['solo'][:2]}{ui.TRACK_CONTROL_DISPLAY_NAMES['arm'][:2]}",
-        **mode_select,
         **track_controls_nav,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "mute-mode.svg",
-        pedal1=pedal("Mute\nTrack 5"),
-        pedal2=pedal("Mute\nTrack 6"),
-        pedal3=pedal("Mute\nTrack 7"),
-        pedal4=pedal("Mute\nTrack 8"),
-        pedal5=pedal("Session\nRecord"),
-        pedal6=pedal("Mute\nTrack 1"),
-        pedal7=pedal("Mute\nTrack 2"),
-        pedal8=pedal("Mute\nTrack 3"),
-        pedal9=pedal("Mute\nTrack 4"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Mute\nTrack 5"),
+                    2: pedal("Mute\nTrack 6"),
+                    3: pedal("Mute\nTrack 7"),
+                    4: pedal("Mute\nTrack 8"),
+                    5: pedal("Session\nRecord"),
+                    6: pedal("Mute\nTrack 1"),
+                    7: pedal("Mute\nTrack 2"),
+                    8: pedal("Mute\nTrack 3"),
+                    9: pedal("Mute\nTrack 4"),
+                }
+            ),
+            mode_select,
+        ),
         display=ui.TRACK_CONTROL_DISPLAY_NAMES["mute"],
-        **mode_select,
         **track_controls_nav,
-    ).save(pretty=True)
+    )
 
-    diagram(
+    add_diagram(
         "track-volume-mode.svg",
-        pedal1=pedal("Track 5\nVolume"),
-        pedal2=pedal("Track 6\nVolume"),
-        pedal3=pedal("Track 7\nVolume"),
-        pedal4=pedal("Track 8\nVolume"),
-        pedal5=pedal("Session\nRecord"),
-        pedal6=pedal("Track 1\nVolume"),
-        pedal7=pedal("Track 2\nVolume"),
-        pedal8=pedal("Track 3\nVolume"),
-        pedal9=pedal("Track 4\nVolume"),
+        pedals=merge_pedals(
+            pedals_for_keys(
+                {
+                    1: pedal("Track 5\nVolume"),
+                    2: pedal("Track 6\nVolume"),
+                    3: pedal("Track 7\nVolume"),
+                    4: pedal("Track 8\nVolume"),
+                    5: pedal("Session\nRecord"),
+                    6: pedal("Track 1\nVolume"),
+                    7: pedal("Track 2\nVolume"),
+                    8: pedal("Track 3\nVolume"),
+                    9: pedal("Track 4\nVolume"),
+                }
+            ),
+            mode_select,
+        ),
         display=ui.TRACK_CONTROL_DISPLAY_NAMES["volume"],
-        **mode_select,
         **track_controls_nav,
-    ).save(pretty=True)
+    )
 
     edit_track_control_pedals: typing.Dict[types.TrackControl, Pedal] = {
         "track_select": pedal("Select\nTrack"),
@@ -699,20 +969,43 @@ if __name__ == "__main__":
         "volume": pedal("Volume"),
     }
 
-    edit_track_control_pedal_params: typing.Dict[str, PedalOpt] = {
-        **params_from_key_map(
+    edit_track_control_pedals_by_key = merge_pedals(
+        params_from_key_map(
             ui.EDIT_TRACK_CONTROL_KEY_MAP,
             lambda track_control: edit_track_control_pedals[track_control],
         ),
-        "pedal0": pedal("Cancel", "Disable\nPreset"),
-        "pedal5": pedal("Custom Action\n(Transport)", "Custom Action\n(Util)"),
-    }
-    diagram(
+        pedals_for_keys(
+            {
+                0: pedal("Cancel", "Disable\nPreset"),
+                5: pedal("Custom Action\n(Transport)", "Custom Action\n(Util)"),
+            }
+        ),
+    )
+    add_diagram(
         "edit-track-control.svg",
+        pedals=edit_track_control_pedals_by_key,
         display="1Top",
         **navigation("edit_track_controls_1"),
-        **edit_track_control_pedal_params,
-    ).save(pretty=True)
+    )
+
+    # Skip diagrams whose inputs haven't changed since the last run.
+    with open(__file__, "rb") as f:
+        generator_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    cache = _load_cache()
+    updated_cache: typing.Dict[str, str] = {}
+    pending_jobs: typing.List[DiagramJob] = []
+    for job in jobs:
+        filename = job[0]
+        job_hash = _job_hash(generator_hash, job)
+        updated_cache[filename] = job_hash
+        if cache.get(filename) != job_hash or not os.path.exists(filename):
+            pending_jobs.append(job)
+
+    if pending_jobs:
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            # Consume the results to surface any errors from the workers.
+            list(executor.map(_render, pending_jobs))
+    _save_cache(updated_cache)
 
 # Local Variables:
 # compile-command: "python generate.py"
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import asyncio
 import functools
-import importlib.machinery
 import importlib.util
 import os
+import sys
 import time
 import webbrowser
 from contextlib import ExitStack, asynccontextmanager
@@ -31,7 +31,6 @@ from typing import (
     Union,
 )
 
-import janus
 import mido
 from pytest import fixture
 from pytest_bdd import given, parsers, then, when
@@ -51,31 +50,34 @@ else:
     # surface, but the hardware and sysex constants would be too annoying to
     # duplicate. Load it manually from the path, see
     # https://csatlas.com/python-import-file-module/#import_a_file_in_a_different_directory.
+    #
+    # Loaded modules are registered in `sys.modules` under a private prefix, so that
+    # re-importing this file (e.g. during re-collection) reuses them.
     def _load_module_from_path(name: str, path: str):
-        path = os.path.join(path, f"{name}.py")
-        loader = importlib.machinery.SourceFileLoader(name, path)
-        spec = importlib.util.spec_from_loader(name, loader)
+        module_name = f"_modestep_tests.{name}"
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+
+        spec = importlib.util.spec_from_file_location(
+            module_name, os.path.join(path, f"{name}.py")
+        )
+        assert spec is not None and spec.loader is not None
         module = importlib.util.module_from_spec(spec)
-        loader.exec_module(module)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
         return module
 
-    hardware = _load_module_from_path(
-        "hardware",
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "..",
-            "control_surface",
-            "elements",
-        ),
+    _control_surface_dir = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), "..", "control_surface"
     )
-    sysex = _load_module_from_path(
-        "sysex",
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)),
-            "..",
-            "control_surface",
-        ),
+    hardware = _load_module_from_path(
+        "hardware", os.path.join(_control_surface_dir, "elements")
     )
+    sysex = _load_module_from_path("sysex", _control_surface_dir)
 
 is_debug = "DEBUG" in os.environ
 
@@ -86,6 +88,17 @@ P = ParamSpec("P")
 # http://midi.teragonaudio.com/tech/midispec/identity.htm.
 IDENTITY_REQUEST_SYSEX = (0xF0, 0x7E, 0x7F, 0x06, 0x01, 0xF7)
 
+# Our response to identity requests. Sending doesn't modify the message, so a single
+# instance can be reused.
+IDENTITY_RESPONSE = mido.Message(
+    "sysex",
+    data=(
+        (0x7E, 0x7F, 0x06, 0x02)
+        + sysex.MANUFACTURER_ID_BYTES
+        + sysex.DEVICE_FAMILY_BYTES
+    ),
+)
+
 # Copypasta but we want to isolate the test files from the main module.
 RED_LED_BASE_CC = 20
 GREEN_LED_BASE_CC = 110
@@ -98,11 +111,18 @@ CLEAR_CC = 0
 DISPLAY_BASE_CC = 50
 DISPLAY_WIDTH = 4
 
+# Placeholder for LED/display values which are unknown/unmanaged. CC values are 7-bit,
+# so this can't collide with a real value.
+UNKNOWN_VALUE = 0xFF
+
 # Exit button in standalone modes.
 STANDALONE_EXIT_CC = 80
 
 MIDI_CHANNEL = 0
 
+# Number of possible CC numbers, i.e. the range of 7-bit values.
+NUM_CCS = 128
+
 # The number of seconds to wait after the controller responds to a ping before
 # considering it responsive. Particularly when booting Live to open a set, there's
 # usually a period where the controller reacts slowly after responding to a ping.
@@ -120,37 +140,77 @@ STABILITY_DELAY = 0.15
 # Seconds to wait to trigger a long press.
 LONG_PRESS_DELAY = 0.6
 
-# Time between iterations of polling loops.
-POLL_INTERVAL = 0.03
-
 # The number of separate messages, which we'll track individually, which need to be sent
 # to switch modes.
 NUM_STANDALONE_TOGGLE_MESSAGES = len(sysex.SYSEX_STANDALONE_MODE_ON_REQUESTS)
 assert len(sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS) == NUM_STANDALONE_TOGGLE_MESSAGES
 
+# All messages which can be sent while switching between standalone and hosted mode.
+_STANDALONE_TOGGLE_REQUESTS = (
+    *sysex.SYSEX_STANDALONE_MODE_ON_REQUESTS,
+    *sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS,
+)
+
+
+# Shared console for step output. Creating a console probes the terminal, so only do
+# it once.
+@functools.cache
+def _console() -> Console:
+    return Console()
+
 
 # Error handling.
 @typechecked
 def pytest_bdd_step_error(step: Step, feature: Feature, step_func_args: Dict[str, Any]):
-    console = Console()
+    console = _console()
     console.print(
         f"\n[bright_red bold]{feature.rel_filename}:{step.line_number}:[/bright_red bold] [red]{step.name}[/red]"
     )
     device_state: Optional[DeviceState] = step_func_args.get("device_state")
     if device_state is not None:
-        device_state.print()
+        device_state.print(console)
 
 
 @typechecked
 def pytest_bdd_after_step(step: Step, feature: Feature, step_func_args: Dict[str, Any]):
-    if is_debug:
-        console = Console()
-        console.print(
-            f"\n[green bold]{feature.rel_filename}:{step.line_number}:[/green bold] {step.keyword} {step.name}"
+    if not is_debug:
+        return
+
+    console = _console()
+    console.print(
+        f"\n[green bold]{feature.rel_filename}:{step.line_number}:[/green bold] {step.keyword} {step.name}"
+    )
+    device_state: Optional[DeviceState] = step_func_args.get("device_state")
+    if device_state is not None:
+        device_state.print(console)
+
+
+# Console (text, style) representations of LED states.
+_LED_STATE_REPRESENTATIONS = {
+    UNKNOWN_VALUE: ("??", ""),  # unknown/unmanaged
+    0: ("  ", ""),  # off
+    1: ("ON", "reverse"),  # on
+    2: ("BL", ""),  # normal blink
+    3: ("FB", "underline"),  # fast blink
+    # flash omitted as it's not used.
+}
+
+# Console representations of LEDs by (red state, green state). These are shared across
+# renders rather than recreated for every table cell. Combinations with differing
+# nonzero states (i.e. mixed colors) aren't supported.
+_LED_TEXTS: Dict[Tuple[int, int], Text] = {
+    (0, 0): Text("  ", style=" "),
+    **{
+        states: Text(text, style=f"{color} {state_style}")
+        for state, (text, state_style) in _LED_STATE_REPRESENTATIONS.items()
+        if state != 0
+        for states, color in (
+            ((state, 0), "red"),
+            ((0, state), "green"),
+            ((state, state), "yellow"),
         )
-        device_state: Optional[DeviceState] = step_func_args.get("device_state")
-        if device_state is not None:
-            device_state.print()
+    },
+}
 
 
 # Read-only view of the SoftStep LED/Display state based on incoming MIDI messages.
@@ -162,17 +222,73 @@ class DeviceState:
         mode = "mode"
         program = "program"
 
+    # The state is read and updated for every incoming message, so avoid the overhead of
+    # a per-instance dict.
+    __slots__ = (
+        "_red_values",
+        "_green_values",
+        "_deprecated_led_values",
+        "_display_values",
+        "_display_text",
+        "_display_text_stale",
+        "_cc_dispatch",
+        "_standalone_toggles",
+        "_standalone_transitioning",
+        "_backlight",
+        "_standalone_program",
+        "__allow_ccs_until_managed",
+        "_message_handlers",
+        "_sysex_handlers",
+    )
+
     def __init__(self) -> None:
+        num_keys = hardware.NUM_ROWS * hardware.NUM_COLS
+
         # Directly-set set LED values, indexed by ((physical key number - 1) % 10),
-        # i.e. from the bottom left.
-        self._red_values: List[Optional[int]]
-        self._green_values: List[Optional[int]]
+        # i.e. from the bottom left. Unknown values are stored as `UNKNOWN_VALUE`.
+        self._red_values: bytearray = bytearray(num_keys)
+        self._green_values: bytearray = bytearray(num_keys)
 
         # Pending values for setting colors via the older API.
-        self._deprecated_led_values: List[Optional[int]]
+        self._deprecated_led_values: bytearray = bytearray(NUM_DEPRECATED_LED_FIELDS)
 
         # Display characters.
-        self._display_values: List[Optional[int]]
+        self._display_values: bytearray = bytearray(DISPLAY_WIDTH)
+
+        # Decoded display text, recomputed lazily after the display values change.
+        self._display_text: Optional[str] = None
+        self._display_text_stale: bool = True
+
+        # Lookup from CC number to the (array, index, category) that it updates, or
+        # `None` for CCs that don't update an array. The arrays above are only ever
+        # modified in place, so these references stay valid.
+        self._cc_dispatch: List[
+            Optional[Tuple[bytearray, int, DeviceState.UpdateCategory]]
+        ] = [None] * NUM_CCS
+        for base_cc, values, category in (
+            (
+                DEPRECATED_LED_BASE_CC,
+                self._deprecated_led_values,
+                DeviceState.UpdateCategory.lights,
+            ),
+            (
+                RED_LED_BASE_CC,
+                self._red_values,
+                DeviceState.UpdateCategory.lights,
+            ),
+            (
+                GREEN_LED_BASE_CC,
+                self._green_values,
+                DeviceState.UpdateCategory.lights,
+            ),
+            (
+                DISPLAY_BASE_CC,
+                self._display_values,
+                DeviceState.UpdateCategory.display,
+            ),
+        ):
+            for index in range(len(values)):
+                self._cc_dispatch[base_cc + index] = (values, index, category)
 
         # States of individual toggles for standalone mode. Each one can be true
         # (standalone mode), false (hosted mode), or None if no corresponding message
@@ -180,6 +296,10 @@ class DeviceState:
         # so we should never stay in a state with some toggles flipped and some not.
         self._standalone_toggles: List[Optional[bool]]
 
+        # Whether the standalone toggles currently differ, i.e. whether we're in the
+        # middle of a transition. Updated whenever a toggle is written.
+        self._standalone_transitioning: bool
+
         # Backlight on/off, or unset (None).
         self._backlight: Optional[bool]
 
@@ -192,11 +312,42 @@ class DeviceState:
         # Tracker for validation error suppression prior to device init.
         self.__allow_ccs_until_managed: bool = False
 
+        # Handlers for allowed message types.
+        self._message_handlers: Dict[
+            str, Callable[[mido.Message], DeviceState.UpdateCategory]
+        ] = {
+            "control_change": self._receive_cc,
+            "program_change": self._receive_program_change,
+            "sysex": self._receive_sysex,
+        }
+
+        # Handlers for recognized sysex messages, keyed by the message data (i.e.
+        # without the F0/F7 at the start/end).
+        self._sysex_handlers: Dict[
+            Tuple[int, ...], Callable[[], DeviceState.UpdateCategory]
+        ] = {
+            tuple(sysex.SYSEX_BACKLIGHT_OFF_REQUEST[1:-1]): partial(
+                self._set_backlight, False
+            ),
+            tuple(sysex.SYSEX_BACKLIGHT_ON_REQUEST[1:-1]): partial(
+                self._set_backlight, True
+            ),
+        }
+        for requests, standalone in (
+            (sysex.SYSEX_STANDALONE_MODE_ON_REQUESTS, True),
+            (sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS, False),
+        ):
+            for idx, request in enumerate(requests):
+                self._sysex_handlers[tuple(request[1:-1])] = partial(
+                    self._set_standalone_toggle, idx, standalone
+                )
+
     # Reset all properties to unknown/unmanaged.
     def reset(self) -> None:
         self._reset_leds_and_display()
 
         self._standalone_toggles = [None] * NUM_STANDALONE_TOGGLE_MESSAGES
+        self._standalone_transitioning = False
 
         self._backlight = None
 
@@ -207,33 +358,35 @@ class DeviceState:
     # to standalone mode, where these values can change based on user actions
     # (i.e. independently of CC messages being sent to the device).
     def _reset_leds_and_display(self) -> None:
-        num_keys = hardware.NUM_ROWS * hardware.NUM_COLS
-
-        self._red_values = [None] * num_keys
-        self._green_values = [None] * num_keys
-        self._deprecated_led_values = [None] * NUM_DEPRECATED_LED_FIELDS
-
-        self._display_values = [None] * DISPLAY_WIDTH
+        for values in (
+            self._red_values,
+            self._green_values,
+            self._deprecated_led_values,
+            self._display_values,
+        ):
+            values[:] = bytes((UNKNOWN_VALUE,)) * len(values)
+        self._display_text_stale = True
 
     @property
-    def red_values(self) -> Sequence[Optional[int]]:
+    def red_values(self) -> Sequence[int]:
         return self._red_values
 
     @property
-    def green_values(self) -> Sequence[Optional[int]]:
+    def green_values(self) -> Sequence[int]:
         return self._green_values
 
     @property
     def display_text(self) -> Optional[str]:
-        assert len(self._display_values) == DISPLAY_WIDTH
-        result = ""
-        for value in self._display_values:
+        if self._display_text_stale:
+            values = self._display_values
+            assert len(values) == DISPLAY_WIDTH
             # If any character values are unknown, treat the whole display content as
             # unknown.
-            if value is None:
-                return None
-            result += chr(value)
-        return result
+            self._display_text = (
+                None if UNKNOWN_VALUE in values else values.decode("latin-1")
+            )
+            self._display_text_stale = False
+        return self._display_text
 
     # Individual trackers for the various messages that need to be sent to enter/exit
     # standalone mode.
@@ -258,152 +411,125 @@ class DeviceState:
         but which indicate something unexpected happening with the control surface.
 
         """
-        msg_type, msg_channel = [
-            message.dict().get(field, None) for field in ("type", "channel")
-        ]
-
-        # Check whether the message type is generally allowed, based on the current
-        # state of the device.
-        if len(set(self.standalone_toggles)) == 1:
-            # All toggles are the same, we're not in the middle of a transition.
-            standalone_status = list(self.standalone_toggles)[0]
-
-            if message.is_cc():
-                assert standalone_status is False or (
-                    # Check whether we're suppressing these errors during init.
-                    #
-                    # Note that it should only be possible for this to be `True` when
-                    # the standalone status is `None`.
-                    self.__allow_ccs_until_managed
-                ), f"CC messages are only expected in hosted mode: {message}"
-            elif msg_type == "program_change":
-                assert (
-                    standalone_status is True
-                ), f"Program Change messages are only expected in standalone mode: {message}"
-            elif msg_type == "sysex":
-                # These are allowed.
-                pass
-            else:
-                raise RuntimeError(f"Unexpected message type: {message}")
-
-        else:
-            # If the standalone toggles aren't all the same, i.e. if we're in the
-            # process of transitioning between standalone and hosted mode, only allow
-            # additional standalone toggle messages.
+        # If the standalone toggles aren't all the same, i.e. if we're in the process of
+        # transitioning between standalone and hosted mode, only allow additional
+        # standalone toggle messages.
+        if self._standalone_transitioning:
             assert (
-                msg_type == "sysex"
+                message.type == "sysex"
             ), f"Non-sysex messages not allowed while switching between standalone and hosted mode: {message}"
             assert any(
-                matches_sysex(message, t)
-                for t in sysex.SYSEX_STANDALONE_MODE_ON_REQUESTS
-                + sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS
+                matches_sysex(message, t) for t in _STANDALONE_TOGGLE_REQUESTS
             ), f"Invalid sysex message while switching between standalone and hosted mode: {message}"
 
-        # Now handle the message in the interface.
-        if message.is_cc():
-            assert (
-                msg_channel == MIDI_CHANNEL
-            ), f"Got CC on unexpected channel: {message}"
-
-            _, cc, value = message.bytes()
-
-            # A few of these get sent immediately after activating LEDs via the
-            # deprecated color API, which (evidently) causes the hardware to flush
-            # updates and avoids issues when configuring additional LEDs via this API.
+        # Check whether the message type is generally allowed, and handle it. The
+        # handlers impose any additional restrictions based on the current state of the
+        # device.
+        handler = self._message_handlers.get(message.type)
+        if handler is None:
+            raise RuntimeError(f"Unexpected message type: {message}")
+        return handler(message)
+
+    # Handlers for specific message types. These are only invoked outside of
+    # standalone/hosted transitions, except for sysex messages.
+    def _receive_cc(self, message: mido.Message) -> DeviceState.UpdateCategory:
+        assert self._standalone_toggles[0] is False or (
+            # Check whether we're suppressing these errors during init.
             #
-            # When we receive one of these messages, commit the LED color from the
-            # deprecated API. This isn't an exact replica of the real hardware behavior,
-            # which has more edge cases and bugs, but we're only using this feature in a
-            # controlled way to render solid yellow.
-            if cc == CLEAR_CC:
-                if all([value is not None for value in self._deprecated_led_values]):
-                    location, color, state = self._deprecated_led_values
-                    if color != 2:  # yellow
-                        raise RuntimeError("only expected yellow")
-                    for values in (self._red_values, self._green_values):
-                        assert location is not None
-                        assert state is not None
-                        values[location] = state
-                self._deprecated_led_values = [None] * len(self._deprecated_led_values)
-                return DeviceState.UpdateCategory.lights
-            else:
-                # Detect values that update internal arrays.
-                for base_cc, values, category in (
-                    (
-                        DEPRECATED_LED_BASE_CC,
-                        self._deprecated_led_values,
-                        DeviceState.UpdateCategory.lights,
-                    ),
-                    (
-                        RED_LED_BASE_CC,
-                        self._red_values,
-                        DeviceState.UpdateCategory.lights,
-                    ),
-                    (
-                        GREEN_LED_BASE_CC,
-                        self._green_values,
-                        DeviceState.UpdateCategory.lights,
-                    ),
-                    (
-                        DISPLAY_BASE_CC,
-                        self._display_values,
-                        DeviceState.UpdateCategory.display,
-                    ),
-                ):
-                    if base_cc <= cc < base_cc + len(values):
-                        values[cc - base_cc] = value
-
-                        return category
-
-        # Handle program changes, verify that we're in standalone mode.
-        elif msg_type == "program_change":
-            assert (
-                msg_channel == MIDI_CHANNEL
-            ), f"Got Program Change on unexpected channel: {message}"
-
-            # We already verified that we're in standalone mode above, but sanity
-            # check to be sure.
-            assert all(t is True for t in self.standalone_toggles)
-
-            program = message.dict()["program"]
-            assert isinstance(program, int)
-            self._standalone_program = program
-            return DeviceState.UpdateCategory.program
-
-        # Handle backlight toggle messages.
-        elif matches_sysex(message, sysex.SYSEX_BACKLIGHT_OFF_REQUEST):
-            self._backlight = False
-            return DeviceState.UpdateCategory.backlight
-        elif matches_sysex(message, sysex.SYSEX_BACKLIGHT_ON_REQUEST):
-            self._backlight = True
-            return DeviceState.UpdateCategory.backlight
-
-        # The only other allowed messages are the sysexes to toggle between
-        # standalone/hosted mode.
-        elif msg_type == "sysex":
-            # Set standalone toggle flags if appropriate.
-            for requests, standalone in (
-                (sysex.SYSEX_STANDALONE_MODE_ON_REQUESTS, True),
-                (sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS, False),
-            ):
-                for idx, request in enumerate(requests):
-                    if matches_sysex(message, request):
-                        self._standalone_toggles[idx] = standalone
-
-                        # Clear the CC validation error suppression if the device mode
-                        # is now fully managed.
-                        if all(t is not None for t in self._standalone_toggles):
-                            self.__allow_ccs_until_managed = False
-
-                        # If we just switched to standalone mode, the LEDs and display
-                        # are no longer under our control.
-                        if all(t is True for t in self._standalone_toggles):
-                            self._reset_leds_and_display()
-
-                        return DeviceState.UpdateCategory.mode
-
-        # If we haven't returned by this point, the message is unrecognized.
-        raise ValueError(f"Unrecognized message: {message}")
+            # Note that it should only be possible for this to be `True` when the
+            # standalone status is `None`.
+            self.__allow_ccs_until_managed
+        ), f"CC messages are only expected in hosted mode: {message}"
+        assert (
+            message.channel == MIDI_CHANNEL
+        ), f"Got CC on unexpected channel: {message}"
+
+        cc = message.control
+        value = message.value
+
+        # A few of these get sent immediately after activating LEDs via the deprecated
+        # color API, which (evidently) causes the hardware to flush updates and avoids
+        # issues when configuring additional LEDs via this API.
+        #
+        # When we receive one of these messages, commit the LED color from the
+        # deprecated API. This isn't an exact replica of the real hardware behavior,
+        # which has more edge cases and bugs, but we're only using this feature in a
+        # controlled way to render solid yellow.
+        if cc == CLEAR_CC:
+            if UNKNOWN_VALUE not in self._deprecated_led_values:
+                location, color, state = self._deprecated_led_values
+                if color != 2:  # yellow
+                    raise RuntimeError("only expected yellow")
+                for values in (self._red_values, self._green_values):
+                    values[location] = state
+            self._deprecated_led_values[:] = bytes((UNKNOWN_VALUE,)) * len(
+                self._deprecated_led_values
+            )
+            return DeviceState.UpdateCategory.lights
+
+        # Detect values that update internal arrays.
+        entry = self._cc_dispatch[cc]
+        if entry is None:
+            raise ValueError(f"Unrecognized message: {message}")
+
+        values, index, category = entry
+        values[index] = value
+        if category is DeviceState.UpdateCategory.display:
+            self._display_text_stale = True
+
+        return category
+
+    # Handle program changes, verify that we're in standalone mode.
+    def _receive_program_change(
+        self, message: mido.Message
+    ) -> DeviceState.UpdateCategory:
+        assert (
+            self._standalone_toggles[0] is True
+        ), f"Program Change messages are only expected in standalone mode: {message}"
+        assert (
+            message.channel == MIDI_CHANNEL
+        ), f"Got Program Change on unexpected channel: {message}"
+
+        # We already verified that we're in standalone mode above, but sanity check to
+        # be sure.
+        assert all(t is True for t in self.standalone_toggles)
+
+        program = message.program
+        assert isinstance(program, int)
+        self._standalone_program = program
+        return DeviceState.UpdateCategory.program
+
+    # The only allowed sysexes are those to toggle the backlight or to switch between
+    # standalone/hosted mode.
+    def _receive_sysex(self, message: mido.Message) -> DeviceState.UpdateCategory:
+        # Sysex data is a tuple, so it can be used directly as a key.
+        handler = self._sysex_handlers.get(message.data)
+        if handler is None:
+            raise ValueError(f"Unrecognized message: {message}")
+        return handler()
+
+    def _set_backlight(self, backlight: bool) -> DeviceState.UpdateCategory:
+        self._backlight = backlight
+        return DeviceState.UpdateCategory.backlight
+
+    def _set_standalone_toggle(
+        self, idx: int, standalone: bool
+    ) -> DeviceState.UpdateCategory:
+        toggles = self._standalone_toggles
+        toggles[idx] = standalone
+        self._standalone_transitioning = any(t is not toggles[0] for t in toggles)
+
+        # Clear the CC validation error suppression if the device mode is now fully
+        # managed.
+        if all(t is not None for t in self._standalone_toggles):
+            self.__allow_ccs_until_managed = False
+
+        # If we just switched to standalone mode, the LEDs and display are no longer
+        # under our control.
+        if all(t is True for t in self._standalone_toggles):
+            self._reset_leds_and_display()
+
+        return DeviceState.UpdateCategory.mode
 
     # Don't error on incoming CCs as long as the standalone/hosted mode status is
     # unmanaged. Restore the default validation behavior once the status has been set
@@ -426,48 +552,22 @@ class DeviceState:
 
     # Generate a console-printable representation of the LED states and display text.
     def _create_table(self) -> Table:
-        led_state_representations = {
-            None: ("??", ""),  # unknown/unmanaged
-            0: ("  ", ""),  # off
-            1: ("ON", "reverse"),  # on
-            2: ("BL", ""),  # normal blink
-            3: ("FB", "underline"),  # fast blink
-            # flash omitted as it's not used.
-        }
-
-        def led(red: Optional[int], green: Optional[int]) -> Union[str, Text]:
-            style = ""
-            state: Optional[int] = 0
-
-            if red == 0 and green == 0:
-                pass
-            elif red == 0:
-                style = "green"
-                state = green
-            elif green == 0:
-                style = "red"
-                state = red
-            elif red == green:
-                style = "yellow"
-                state = red  # either way.
-            else:  # red and green differ but are both nonzero.
-                raise RuntimeError("mixed LED states not supported")
-
-            text, state_style = led_state_representations[state]
-            return Text(text, style=f"{style} {state_style}")
+        def led(red: int, green: int) -> Union[str, Text]:
+            text = _LED_TEXTS.get((red, green))
+            if text is None:
+                raise RuntimeError(f"unsupported LED state: red={red}, green={green}")
+            return text
 
         table = Table(show_header=False, show_lines=True)
         num_key_cols = hardware.NUM_COLS
         for base_offset in (num_key_cols, 0):
+            row = slice(base_offset, base_offset + num_key_cols)
             table.add_row(
                 *[
-                    led(
-                        *[
-                            values[base_offset + index]
-                            for values in (self._red_values, self._green_values)
-                        ]
+                    led(red, green)
+                    for red, green in zip(
+                        self._red_values[row], self._green_values[row], strict=True
                     )
-                    for index in range(num_key_cols)
                 ],
                 (
                     Text(
@@ -484,7 +584,7 @@ class DeviceState:
 
     def print(self, console: Optional[Console] = None):
         if console is None:
-            console = Console()
+            console = _console()
 
         console.print(self._create_table())
 
@@ -499,24 +599,23 @@ def guard_message_exceptions(
         device = a[0]
         assert isinstance(device, Device)
 
-        async def raise_exception():
-            await device._exception_event.wait()
+        # Race the wrapped call against the device's shared exception watcher.
+        task = asyncio.ensure_future(fn(*a, **k))
+        try:
+            await asyncio.wait(
+                (task, device._exception_watcher()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            # Don't leave the wrapped call running if we're exiting early, i.e. due to
+            # a message handling exception or a cancellation.
+            if not task.done():
+                task.cancel()
 
-            exc = device._exception
-            assert exc is not None
+        exc = device._exception
+        if exc is not None:
             raise exc
-
-        async with asyncio.TaskGroup() as task_group:
-            # If this throws an exception, it will be raised and the whole group will be
-            # destroyed.
-            exception_task = task_group.create_task(raise_exception())
-
-            # If this finishes before an exception is raised, we can cancel the
-            # exception task to tear down the group.
-            result = await task_group.create_task(fn(*a, **k))
-            exception_task.cancel()
-
-            return result
+        return task.result()
 
     return wrapper
 
@@ -527,6 +626,26 @@ def guard_message_exceptions(
 # handler is properly started and cleaned up, and all interaction should occur within
 # the same async loop.
 class Device:
+    # Attributes are accessed for every incoming message, so avoid the overhead of a
+    # per-instance dict.
+    __slots__ = (
+        "_ioport",
+        "_device_state",
+        "_relay_ports",
+        "__queues",
+        "__queues_lock",
+        "__next_queue_id",
+        "__process_messages_task",
+        "_exception_event",
+        "_exception",
+        "__exception_watcher",
+        "__identity_request_event",
+        "__ping_event",
+        "__sysex_handlers",
+        "__update_times",
+        "__update_events",
+    )
+
     def __init__(
         self,
         # If provided, forward all incoming MIDI messages to these ports. Used for
@@ -544,54 +663,84 @@ class Device:
         #
         # `None` will be pushed when the device is torn down, i.e. no more messages can
         # be received.
-        self.__queues: Dict[int, janus.Queue[mido.Message]] = {}
+        #
+        # Each queue is stored alongside the event loop it belongs to, since messages
+        # arrive on mido's callback thread and need to be handed off to that loop.
+        self.__queues: Dict[
+            int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue[mido.Message]]
+        ] = {}
         self.__queues_lock = Lock()
 
+        # IDs are never reused, so each queue just gets the next one in sequence.
+        self.__next_queue_id: int = 0
+
         # Background task for processing incoming messages.
         self.__process_messages_task: Optional[asyncio.Task] = None
 
         # Trackers for exceptions thrown while processing incoming messages.
         self._exception_event = asyncio.Event()
         self._exception: Optional[Exception] = None
+        self.__exception_watcher: Optional[asyncio.Future] = None
 
         # Trackers for messages that aren't part of the main device state.
         self.__identity_request_event = asyncio.Event()
         self.__ping_event = asyncio.Event()
 
+        # Handlers for sysex messages which are processed outside of the device state,
+        # keyed by the message data (i.e. without the F0/F7 at the start/end).
+        self.__sysex_handlers: Dict[Tuple[int, ...], Callable[[], None]] = {
+            tuple(IDENTITY_REQUEST_SYSEX[1:-1]): self.__on_identity_request,
+            tuple(sysex.SYSEX_PING_RESPONSE[1:-1]): self.__on_ping_response,
+        }
+
         # Last update times by category, so we can detect whether the device is being
-        # actively updated.
-        self.__update_times: Dict[DeviceState.UpdateCategory, float] = {}
+        # actively updated. These are integer nanoseconds from the monotonic clock, whose
+        # reference point is arbitrary, so "never updated" is represented as None.
+        self.__update_times: Dict[DeviceState.UpdateCategory, Optional[int]] = {}
         for category in DeviceState.UpdateCategory:
-            self.__update_times[category] = 0.0
+            self.__update_times[category] = None
+
+        # Events which get set whenever the corresponding category of state is updated,
+        # so that waiters can re-check their conditions.
+        self.__update_events: Dict[DeviceState.UpdateCategory, asyncio.Event] = {
+            category: asyncio.Event() for category in DeviceState.UpdateCategory
+        }
 
     @asynccontextmanager
     async def incoming_messages(
         self,
-    ) -> AsyncGenerator[janus.AsyncQueue[mido.Message], Never]:
-        queue: janus.Queue[mido.Message] = janus.Queue()
+    ) -> AsyncGenerator[asyncio.Queue[mido.Message], Never]:
+        queue: asyncio.Queue[mido.Message] = asyncio.Queue()
         queue_id: int
         with self.__queues_lock:
             # Get a unique ID for this queue.
-            queue_id = max([0, *self.__queues.keys()]) + 1
+            queue_id = self.__next_queue_id
+            self.__next_queue_id += 1
 
             # Store the queue so that it will be populated by the incoming message
             # handler.
-            self.__queues[queue_id] = queue
+            self.__queues[queue_id] = (asyncio.get_running_loop(), queue)
 
         try:
-            yield queue.async_q
+            yield queue
         finally:
             # Remove the queue from future message handling.
             with self.__queues_lock:
                 del self.__queues[queue_id]
 
-            # Clean up background tasks.
-            await queue.aclose()
-
     @property
     def device_state(self) -> DeviceState:
         return self._device_state
 
+    # Shared future which completes once an exception has been thrown while processing
+    # incoming messages. This is created lazily, as it needs a running event loop.
+    def _exception_watcher(self) -> asyncio.Future:
+        if self.__exception_watcher is None:
+            self.__exception_watcher = asyncio.ensure_future(
+                self._exception_event.wait()
+            )
+        return self.__exception_watcher
+
     @property
     def is_connected(self) -> bool:
         return self._ioport is not None
@@ -628,11 +777,15 @@ class Device:
 
     # Root-level MIDI message handler, invoked by mido in a separate thread.
     def __on_message(self, message: mido.Message):
+        # Only hold the lock while copying the current subscribers. A queue that gets
+        # removed in the meantime may receive one last message, which is harmless.
         with self.__queues_lock:
-            for queue in self.__queues.values():
-                # Thread-safe synchronous queue view. The main thread will receive these
-                # via the async view.
-                queue.sync_q.put(message)
+            queues = tuple(self.__queues.values())
+
+        for loop, queue in queues:
+            # asyncio queues aren't thread-safe, so schedule the put on the queue's own
+            # loop.
+            loop.call_soon_threadsafe(queue.put_nowait, message)
 
     # Process all incoming messages (including across disconnects/reconnects), and send
     # responses (e.g. to identity requests) as necessary. This is intended to run as a
@@ -668,34 +821,13 @@ class Device:
         for relay_port in self._relay_ports:
             relay_port.send(message)
 
-        # Identity request sent by Live during startup (potentially more than once)
-        # and when MIDI ports change.
-        if matches_sysex(message, IDENTITY_REQUEST_SYSEX):
-            # Send a response immediately.
-
-            # Greeting request flag gets set forever (until a disconnect) once the
-            # message has been received.
-            if not self.__identity_request_event.is_set():
-                self.__identity_request_event.set()
-
-            self.send(
-                mido.Message(
-                    "sysex",
-                    data=(
-                        (0x7E, 0x7F, 0x06, 0x02)
-                        + sysex.MANUFACTURER_ID_BYTES
-                        + sysex.DEVICE_FAMILY_BYTES
-                    ),
-                )
-            )
-
-        # Response to a ping request. This validates that we're actually connected with
-        # modeStep, and not a different control surface.
-        elif matches_sysex(message, sysex.SYSEX_PING_RESPONSE):
-            # Ping response flag gets cleared immediately after notifying any
-            # current listeners.
-            self.__ping_event.set()
-            self.__ping_event.clear()
+        # Messages that aren't part of the main device state, i.e. identity requests
+        # and ping responses. Sysex data is a tuple, so it can be used directly as a key.
+        handler = (
+            self.__sysex_handlers.get(message.data) if message.type == "sysex" else None
+        )
+        if handler is not None:
+            handler()
 
         # Any other messages are expected to be device state updates. This will throw an
         # error if the message is unrecognized or unexpected in the current state.
@@ -703,7 +835,28 @@ class Device:
             update_category: DeviceState.UpdateCategory = (
                 self._device_state.receive_message(message)
             )
-            self.__update_times[update_category] = time.time()
+            self.__update_times[update_category] = time.monotonic_ns()
+            self.__update_events[update_category].set()
+
+    # Identity request sent by Live during startup (potentially more than once) and
+    # when MIDI ports change.
+    def __on_identity_request(self):
+        # Send a response immediately.
+
+        # Greeting request flag gets set forever (until a disconnect) once the message
+        # has been received.
+        if not self.__identity_request_event.is_set():
+            self.__identity_request_event.set()
+
+        self.send(IDENTITY_RESPONSE)
+
+    # Response to a ping request. This validates that we're actually connected with
+    # modeStep, and not a different control surface.
+    def __on_ping_response(self):
+        # Ping response flag gets cleared immediately after notifying any current
+        # listeners.
+        self.__ping_event.set()
+        self.__ping_event.clear()
 
     @guard_message_exceptions
     async def wait_for_identity_request(self):
@@ -714,8 +867,7 @@ class Device:
         await self.__ping_event.wait()
 
     # Wait until no updates to the given state type(s) have been received for the given
-    # duration. Timing is imprecise (but should never give false positives), as this
-    # uses polling rather than proper async notifications.
+    # duration.
     @guard_message_exceptions
     async def wait_until_stable(
         self,
@@ -724,18 +876,38 @@ class Device:
     ):
         if categories is None:
             categories = list(DeviceState.UpdateCategory)
+        duration_ns = int(duration * 1e9)
 
         while True:
-            current_time = time.time()
-            needs_stability_since = current_time - duration
-            if all(
-                [
-                    self.__update_times[category] <= needs_stability_since
-                    for category in categories
-                ]
-            ):
+            # Sleep until the earliest time at which the state could be stable. Updates
+            # received in the meantime can only push this later, so there's no need to
+            # wake up for them; just re-check once the deadline passes.
+            last_update_time = max(
+                (
+                    update_time
+                    for update_time in (
+                        self.__update_times[category] for category in categories
+                    )
+                    if update_time is not None
+                ),
+                default=None,
+            )
+            if last_update_time is None:
                 break
-            await asyncio.sleep(POLL_INTERVAL)
+            remaining_ns = last_update_time + duration_ns - time.monotonic_ns()
+            if remaining_ns <= 0:
+                break
+            await asyncio.sleep(remaining_ns / 1e9)
+
+    # Wait until the given condition is true, re-checking it whenever the given category
+    # of state is updated.
+    async def __wait_for_update(
+        self, category: DeviceState.UpdateCategory, condition: Callable[[], bool]
+    ):
+        event = self.__update_events[category]
+        while not condition():
+            event.clear()
+            await event.wait()
 
     @guard_message_exceptions
     async def wait_for_initialization(
@@ -743,13 +915,19 @@ class Device:
     ):
         async with asyncio.timeout(timeout):
             # Wait until the device is explicitly placed into standalone or hosted mode.
-            while any(t is None for t in self.device_state.standalone_toggles):
-                await asyncio.sleep(POLL_INTERVAL)
+            await self.__wait_for_update(
+                DeviceState.UpdateCategory.mode,
+                lambda: all(
+                    t is not None for t in self.device_state.standalone_toggles
+                ),
+            )
 
             if require_display:
                 # Wait until something gets rendered to the display.
-                while not (self.device_state.display_text or "").strip():
-                    await asyncio.sleep(POLL_INTERVAL)
+                await self.__wait_for_update(
+                    DeviceState.UpdateCategory.display,
+                    lambda: bool((self.device_state.display_text or "").strip()),
+                )
 
             # Wait until the control surface starts responding to inputs (this can take a second
             # or so if Live was just started).
@@ -798,6 +976,10 @@ class Device:
             pass
         self.__process_messages_task = None
 
+        if self.__exception_watcher is not None:
+            self.__exception_watcher.cancel()
+            self.__exception_watcher = None
+
         # If we reached this point, we expect that the processing task finished
         # successfully, i.e. no exceptions were thrown.
         assert not self._exception_event.is_set()
@@ -819,17 +1001,20 @@ def sync(fn: Callable[P, Coroutine[Any, Any, T]]) -> Callable[P, T]:
 def matches_sysex(
     message: mido.Message, sysex_bytes: Union[List[int], Tuple[int, ...]]
 ):
-    message_attrs = message.dict()
-    if message_attrs["type"] != "sysex":
+    if message.type != "sysex":
         return False
-    data = message_attrs["data"]
-    # Strip the F0/F7 at the start/end of the byte list.
-    return all(x == y for x, y in zip(data, sysex_bytes[1:-1], strict=True))
+    data = message.data
+    # Strip the F0/F7 at the start/end of the byte list. Sysex data is a tuple, so it
+    # can be compared directly once the lengths are known to match.
+    return len(data) == len(sysex_bytes) - 2 and data == tuple(sysex_bytes[1:-1])
 
 
 # Cheap thrills - relay the test port to the physical device for visual feedback during
 # tests, if available.
-@fixture
+#
+# The port is opened once and shared across scenarios, since it's stateless from the
+# tests' point of view.
+@fixture(scope="session")
 @typechecked
 def relay_port() -> Generator[Optional[mido.ports.BaseOutput], None, None]:
     port_name = "SoftStep Control Surface"
@@ -888,11 +1073,15 @@ def _open_live_set(set_name: str):
     webbrowser.open(f"file://{set_file}", autoraise=False)
 
 
+# These get invoked repeatedly (e.g. for every light in a range check), and are pure
+# functions of small inputs.
+@functools.cache
 def _get_index_for_key(key_number: int):
     return (key_number - 1) % (hardware.NUM_ROWS * hardware.NUM_COLS)
 
 
 # CC in hosted mode for a physical key number.
+@functools.cache
 def get_cc_for_key(
     key_number: int, direction: hardware.KeyDirection = hardware.KeyDirection.up
 ) -> int:
@@ -921,6 +1110,19 @@ async def action_press(cc: int, device: Device, duration: float):
     await action_release(cc, device)
 
 
+# Key directions by name, as used in step text.
+_KEY_DIRECTIONS: Dict[str, hardware.KeyDirection] = {
+    direction.name: direction for direction in hardware.KeyDirection
+}
+
+_CC_ACTION_HANDLERS: Dict[str, Callable[[int, Device], Awaitable[Any]]] = {
+    "press": partial(action_press, duration=0.05),
+    "long-press": partial(action_press, duration=LONG_PRESS_DELAY),
+    "hold": action_hold,
+    "release": action_release,
+}
+
+
 # Generic action runner for statements like "When I press key 0", which all have some
 # common setup.
 async def cc_action(
@@ -928,16 +1130,11 @@ async def cc_action(
     action: str,
     device: Device,
 ):
-    handlers: Dict[str, Callable[[int, Device], Awaitable[Any]]] = {
-        "press": partial(action_press, duration=0.05),
-        "long-press": partial(action_press, duration=LONG_PRESS_DELAY),
-        "hold": action_hold,
-        "release": action_release,
-    }
-    if action not in handlers:
+    handler = _CC_ACTION_HANDLERS.get(action)
+    if handler is None:
         raise ValueError(f"Unrecognized action: {action}")
 
-    await handlers[action](cc, device)
+    await handler(cc, device)
 
 
 # Wait for the device LED state to stabilize after pressing a key.
@@ -1079,7 +1276,7 @@ async def when_directional_action(
     direction: str,
     device: Device,
 ):
-    cc = get_cc_for_key(key_number, direction=getattr(hardware.KeyDirection, direction))
+    cc = get_cc_for_key(key_number, direction=_KEY_DIRECTIONS[direction])
     await cc_action(cc, action, device)
     await stabilize_after_cc_action(device)
 
@@ -1092,7 +1289,7 @@ async def when_nav_action(
     direction: str,
     device: Device,
 ):
-    cc = hardware.get_cc_for_nav(getattr(hardware.KeyDirection, direction))
+    cc = hardware.get_cc_for_nav(_KEY_DIRECTIONS[direction])
     await cc_action(cc, action, device)
     await stabilize_after_cc_action(device)
 
@@ -1119,11 +1316,40 @@ async def when_wait(delay: float):
     await asyncio.sleep(delay)
 
 
+# Color descriptions by LED state.
+_COLOR_PREFIXES = {
+    1: "solid",
+    2: "blinking",
+    3: "fast-blinking",
+}
+
+# Full color descriptions by (LED state, color), so they don't need to be formatted for
+# every light that gets checked.
+_COLOR_DESCRIPTIONS: Dict[Tuple[int, str], str] = {
+    (state, color): sys.intern(f"{prefix} {color}")
+    for state, prefix in _COLOR_PREFIXES.items()
+    for color in ("red", "green", "yellow")
+}
+
+
 def get_color(key_number: int, device_state: DeviceState):
     index = _get_index_for_key(key_number)
-    red_state, green_state = [
-        values[index] for values in (device_state.red_values, device_state.green_values)
+    return _get_color_for_states(
+        device_state.red_values[index], device_state.green_values[index]
+    )
+
+
+# Colors for a range of physical key numbers (inclusive).
+def get_colors(start: int, end: int, device_state: DeviceState) -> List[str]:
+    red_values = device_state.red_values
+    green_values = device_state.green_values
+    return [
+        _get_color_for_states(red_values[index], green_values[index])
+        for index in map(_get_index_for_key, range(start, end + 1))
     ]
+
+
+def _get_color_for_states(red_state: int, green_state: int) -> str:
     if red_state == 0 and green_state == 0:
         return "off"
     else:
@@ -1140,18 +1366,12 @@ def get_color(key_number: int, device_state: DeviceState):
             target_state = red_state
             color = "yellow"
 
-        prefixes = {
-            1: "solid",
-            2: "blinking",
-            3: "fast-blinking",
-        }
-        assert color is not None and target_state in prefixes
-        return f"{prefixes[target_state]} {color}"
+        assert color is not None and target_state in _COLOR_PREFIXES
+        return _COLOR_DESCRIPTIONS[target_state, color]
 
 
-def assert_matches_color(key_number: int, color: str, device_state: DeviceState):
-    real_color = get_color(key_number, device_state)
-    assert (
+def _matches_color(color: str, real_color: str) -> bool:
+    return (
         # exact match
         color == real_color
         # allow just providing "solid", "blinking" or "fast-blinking"
@@ -1159,6 +1379,24 @@ def assert_matches_color(key_number: int, color: str, device_state: DeviceState)
     )
 
 
+def _light_matches_color(
+    key_number: int, color: str, device_state: DeviceState
+) -> bool:
+    # Fast path for the common case of checking that a light is off, which doesn't
+    # require describing its actual color.
+    if color == "off":
+        index = _get_index_for_key(key_number)
+        return (
+            device_state.red_values[index] == 0
+            and device_state.green_values[index] == 0
+        )
+    return _matches_color(color, get_color(key_number, device_state))
+
+
+def assert_matches_color(key_number: int, color: str, device_state: DeviceState):
+    assert _light_matches_color(key_number, color, device_state)
+
+
 @then(parsers.parse("light {key_number:d} should be {color}"))
 @typechecked
 def should_be_color(key_number: int, color: str, device_state: DeviceState):
@@ -1168,8 +1406,10 @@ def should_be_color(key_number: int, color: str, device_state: DeviceState):
 @then(parsers.parse("lights {start:d}-{end:d} should be {color}"))
 @typechecked
 def should_be_colors(start: int, end: int, color: str, device_state: DeviceState):
-    for i in range(start, end + 1):
-        assert_matches_color(i, color, device_state)
+    assert all(
+        _light_matches_color(key_number, color, device_state)
+        for key_number in range(start, end + 1)
+    ), f"Expected lights {start}-{end} to be {color}, but got {get_colors(start, end, device_state)}"
 
 
 @then(parsers.parse('the display should be "{text}"'))
@@ -1191,10 +1431,14 @@ def should_be_scrolling_text(text: str, device_state: DeviceState):
     assert device_state.display_text in text
 
 
+# Possible display texts while the mode select screen is active.
+_MODE_SELECT_TEXTS = frozenset((" __ ", "__  ", "_  _", "  __"))
+
+
 @then(parsers.parse("the mode select screen should be active"))
 @typechecked
 def should_be_mode_select(device_state: DeviceState):
-    assert device_state.display_text in (" __ ", "__  ", "_  _", "  __")
+    assert device_state.display_text in _MODE_SELECT_TEXTS
 
 
 @then("the backlight should be on")
@@ -1218,13 +1462,13 @@ def should_be_backlight_unmanaged(device_state: DeviceState):
 @then("the SS2 should be in standalone mode")
 @typechecked
 def should_be_standalone_mode(device_state: DeviceState):
-    assert all([t is True for t in device_state.standalone_toggles])
+    assert all(t is True for t in device_state.standalone_toggles)
 
 
 @then("the SS2 should be in hosted mode")
 @typechecked
 def should_be_hosted_mode(device_state: DeviceState):
-    assert all([t is False for t in device_state.standalone_toggles])
+    assert all(t is False for t in device_state.standalone_toggles)
 
 
 @then(parsers.parse("standalone program {standalone_program:d} should be active"))
@@ -2,7 +2,6 @@ import asyncio
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Collection, Tuple, Union
 
-import janus
 import mido
 from conftest import (
     STANDALONE_EXIT_CC,
@@ -43,7 +42,7 @@ MessageOrException: TypeAlias = Union[Tuple[mido.Message, None], Tuple[None, Exc
 async def _message_queue(
     device: Device,
 ) -> AsyncGenerator[
-    janus.AsyncQueue[mido.Message],
+    asyncio.Queue[mido.Message],
     Never,
 ]:
     async with device.incoming_messages() as queue:
@@ -51,7 +50,7 @@ async def _message_queue(
 
 
 async def _get_next_message(
-    message_queue: janus.AsyncQueue[mido.Message], timeout: float = 5.0
+    message_queue: asyncio.Queue[mido.Message], timeout: float = 5.0
 ) -> mido.Message:
     return await asyncio.wait_for(message_queue.get(), timeout=timeout)
 
@@ -67,7 +66,7 @@ async def should_enter_standalone_program(
     key_number: int, program: int, device: Device, device_state: DeviceState
 ):
     # Make sure the device is fully out of standalone mode.
-    assert all([t is False for t in device_state.standalone_toggles])
+    assert all(t is False for t in device_state.standalone_toggles)
 
     # Events that need to happen in order. Note the background program shouldn't get
     # sent when transitioning in this direction.
@@ -79,15 +78,15 @@ async def should_enter_standalone_program(
         num_initial_ccs: int = 0
         while not received_main_program:
             message = await _get_next_message(queue)
-            message_attrs = message.dict()
+            msg_type = message.type
 
-            if message_attrs["type"] == "sysex":
+            if msg_type == "sysex":
                 remaining_standalone_requests = _dequeue_sysex(
                     message, remaining_standalone_requests
                 )
 
-            elif message_attrs["type"] == "program_change":
-                message_program: int = message_attrs["program"]
+            elif msg_type == "program_change":
+                message_program: int = message.program
                 if message_program == program:
                     # Make sure the controller has already been put into standalone
                     # mode.
@@ -97,7 +96,7 @@ async def should_enter_standalone_program(
                     received_main_program = True
                 else:
                     raise RuntimeError(f"received unexpected program change: {message}")
-            elif message.is_cc():
+            elif msg_type == "control_change":
                 # Allow up to a small number of initial CCs due to the interface being
                 # updated, since these can potentially get sent between the release CC
                 # message and the actual standalone mode activation. The worst case here
@@ -155,9 +154,8 @@ async def should_switch_directly_to_standalone_program(
         await cc_action(STANDALONE_EXIT_CC, "release", device)
         # Make sure we get one message for the program change.
         message = await _get_next_message(queue)
-        message_attrs = message.dict()
-        assert message_attrs["type"] == "program_change"
-        assert message_attrs["program"] == program
+        assert message.type == "program_change"
+        assert message.program == program
 
         # Wait a little while, and make sure we haven't gotten any other messages.
         await asyncio.sleep(0.5)
@@ -181,20 +179,17 @@ async def should_enter_hosted_mode(
 
         # First message needs to be the background program.
         message = await _get_next_message(queue)
-        message_attrs = message.dict()
         assert (
-            message_attrs["type"] == "program_change"
-            and message_attrs["program"] == BACKGROUND_PROGRAM
+            message.type == "program_change" and message.program == BACKGROUND_PROGRAM
         )
 
         # Now make sure we get the right sysex messages.
         remaining_hosted_requests = sysex.SYSEX_STANDALONE_MODE_OFF_REQUESTS
         while any(remaining_hosted_requests):
             message = await _get_next_message(queue)
-            message_attrs = message.dict()
 
             assert (
-                message_attrs["type"] == "sysex"
+                message.type == "sysex"
             ), f"Got non-sysex message before switching out of standalone mode: {message}"
 
             remaining_hosted_requests = _dequeue_sysex(
@@ -203,7 +198,7 @@ async def should_enter_hosted_mode(
 
         # Sanity checks.
         assert (
-            all([d is False for d in device_state.standalone_toggles])
+            all(d is False for d in device_state.standalone_toggles)
             and len(remaining_hosted_requests) == 0
         )
 
@@ -211,5 +206,5 @@ async def should_enter_hosted_mode(
         while not queue.empty():
             message = queue.get_nowait()
             assert (
-                message.is_cc()
+                message.type == "control_change"
             ), f"Got non-CC message after switching to hosted mode: {message}"